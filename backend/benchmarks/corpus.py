@@ -0,0 +1,62 @@
+"""
+Синтетический корпус отзывов для бенчмарков и проверок паритета.
+
+Обучающая выборка в репозитории отсутствует, поэтому корпус собирается из примеров формулировок,
+перечисленных в описаниях классов mapping_backend.json: фразы случайно комбинируются, меняют регистр,
+теряют или дублируют символы. Корпус детерминирован при фиксированном seed.
+"""
+import json
+import pathlib
+import random
+import sys
+from typing import List
+
+BENCHMARKS_DIR = pathlib.Path(__file__).parent.absolute()
+BACKEND_DIR = BENCHMARKS_DIR.parent
+SRC_DIR = BACKEND_DIR / "src"
+DATA_DIR = BACKEND_DIR / "data"
+MODEL_PATH = SRC_DIR / "models" / "model.pkl"
+MAPPING_PATH = DATA_DIR / "mapping_backend.json"
+
+sys.path.append(str(SRC_DIR))
+
+FILLERS = ["спасибо", "ну такое", "в целом", "опять", "как всегда", "!!!", "...", "заказ", "сегодня", "приложение"]
+
+
+def load_phrases() -> List[str]:
+    with open(MAPPING_PATH, "r") as f:
+        mapping = json.load(f)
+    phrases = []
+    for name, description in mapping.values():
+        phrases.append(name)
+        for line in description.splitlines():
+            line = line.strip().lstrip("-").strip()
+            if line:
+                phrases.append(line)
+    return phrases
+
+
+def _distort(text: str, rnd: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rnd.randint(0, 2)):
+        if len(chars) < 2:
+            break
+        pos = rnd.randrange(len(chars))
+        if rnd.random() < 0.5:
+            del chars[pos]
+        else:
+            chars.insert(pos, chars[pos])
+    text = "".join(chars)
+    return text.upper() if rnd.random() < 0.05 else text
+
+
+def make_corpus(size: int, seed: int = 13, min_phrases: int = 1, max_phrases: int = 3) -> List[str]:
+    rnd = random.Random(seed)
+    phrases = load_phrases()
+    corpus = []
+    for _ in range(size):
+        parts = [_distort(rnd.choice(phrases), rnd) for _ in range(rnd.randint(min_phrases, max_phrases))]
+        if rnd.random() < 0.3:
+            parts.insert(rnd.randrange(len(parts) + 1), rnd.choice(FILLERS))
+        corpus.append(" ".join(parts))
+    return corpus
@@ -0,0 +1,58 @@
+"""
+Проверка паритета и замер ускорения LinearScorer относительно исходного Pipeline.
+
+Запуск:
+python backend/benchmarks/fused_scorer.py --sizes 1 10 100 1000 10000
+"""
+import argparse
+import pickle
+import time
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from corpus import MODEL_PATH, make_corpus
+from core.scorer import compile_model
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(sizes: List[int], parity_size: int, repeat: int) -> None:
+    with open(MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+    scorer = compile_model(model)
+
+    corpus = make_corpus(parity_size, seed = 101)
+    frame = pd.DataFrame(columns = ["text"], data = corpus)
+    expected = model.predict(frame)
+    actual = scorer.predict(corpus)
+    mismatches = int(np.sum(np.any(expected != actual, axis = 1)))
+    print(f"parity: {parity_size - mismatches}/{parity_size} rows identical")
+    if mismatches > 0:
+        raise SystemExit(1)
+
+    print(f"{'batch':>8} {'pipeline, ms':>14} {'fused, ms':>12} {'speedup':>8}")
+    for size in sizes:
+        corpus = make_corpus(size, seed = size)
+        frame = pd.DataFrame(columns = ["text"], data = corpus)
+        pipeline_time = best_time(lambda: model.predict(frame), repeat)
+        fused_time = best_time(lambda: scorer.predict(corpus), repeat)
+        print(f"{size:>8} {pipeline_time * 1000:>14.3f} {fused_time * 1000:>12.3f} {pipeline_time / fused_time:>7.1f}x")
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1, 10, 100, 1000, 10000])
+    parser.add_argument("--parity-size", type = int, default = 5000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+    main(args.sizes, args.parity_size, args.repeat)
@@ -0,0 +1,107 @@
+"""
+Замер пропускной способности JSON-логгера до и после перехода на JSONLogFormatter без pydantic и очередь записей.
+
+LegacyJSONLogFormatter повторяет прежнюю реализацию форматирования (модель JsonLogSchema на каждую запись),
+чтобы сравнение можно было воспроизвести на текущем коде. Замеряются:
+- форматирование записи (records/sec);
+- стоимость вызова logger.info() для вызывающего потока: синхронный StreamHandler против JSONQueueHandler.
+
+Запуск:
+python backend/benchmarks/logger.py --records 50000
+"""
+import argparse
+import datetime
+import logging
+import os
+import time
+from typing import Callable
+
+import corpus  # noqa: F401 - добавляет backend/src в sys.path
+from core import logger as json_logger
+from core.logger import JSONLogFormatter, JsonLogSchema
+
+
+class LegacyJSONLogFormatter(JSONLogFormatter):
+
+    def _format_log_object(self, record: logging.LogRecord, *args, **kwargs) -> dict:
+        debug_info_keys = ["threadName", "name", "module", "lineno", "exc_info", "exc_text", "stack_info"]
+        predefined_keys = ["name", "msg", "args", "levelname", "levelno", "pathname", "filename", "module",
+                           "lineno", "exc_info", "exc_text", "stack_info", "funcName", "created", "msecs", "relativeCreated",
+                           "thread", "threadName", "processName", "process"] + list(JsonLogSchema.__dict__.keys())
+        extra_keys = [key for key in record.__dict__.keys() if key not in predefined_keys and record.__dict__[key] is not None]
+        if json_logger.correlation_id_var.get():
+            correlation_id = json_logger.correlation_id_var.get()
+        elif hasattr(record, "correlation_id"):
+            correlation_id = str(record.__dict__["correlation_id"])
+        else:
+            correlation_id = ""
+        json_log_fields = JsonLogSchema(
+            correlation_id = correlation_id,
+            msg = str(record.getMessage()),
+            level = str(record.levelname),
+            id = str(record.__dict__["id"]) if hasattr(record, "id") else "",
+            parent_id = str(record.__dict__["parent_id"]) if hasattr(record, "parent_id") else "",
+            user_id = str(record.__dict__["user_id"]) if hasattr(record, "user_id") else "",
+            item_id = str(record.__dict__["item_id"]) if hasattr(record, "item_id") else "",
+            merchant_id = str(record.__dict__["merchant_id"]) if hasattr(record, "merchant_id") else "",
+            content_type = str(record.__dict__["content_type"]) if hasattr(record, "content_type") else "",
+            written_at = str(datetime.datetime.fromtimestamp(record.created).astimezone().replace().isoformat()),
+            extra = {key: str(record.__dict__[key]) if record.__dict__[key] is not None else None for key in extra_keys},
+            debug_info = {key: str(record.__dict__[key]) if record.__dict__[key] is not None else None for key in debug_info_keys}
+        )
+        return json_log_fields.__dict__
+
+
+def make_record(idx: int) -> logging.LogRecord:
+    record = logging.LogRecord("handlers.ml", logging.INFO, __file__, 42, "A request has been received with body: %s", (f"долго везёте {idx}",), None)
+    record.item_id = idx
+    return record
+
+
+def records_per_second(func: Callable[[int], object], records: int) -> float:
+    start = time.perf_counter()
+    for idx in range(records):
+        func(idx)
+    return records / (time.perf_counter() - start)
+
+
+def main(records: int) -> None:
+    legacy, current = LegacyJSONLogFormatter(), JSONLogFormatter()
+    sample = make_record(0)
+    if legacy.format(sample) != current.format(sample):
+        raise SystemExit("formatters produce different output")
+
+    legacy_rate = records_per_second(lambda idx: legacy.format(make_record(idx)), records)
+    current_rate = records_per_second(lambda idx: current.format(make_record(idx)), records)
+    print(f"{'format':<28} {'records/sec':>12}")
+    print(f"{'legacy (pydantic)':<28} {legacy_rate:>12.0f}")
+    print(f"{'JSONLogFormatter':<28} {current_rate:>12.0f} ({current_rate / legacy_rate:.1f}x)")
+
+    with open(os.devnull, "w") as devnull:
+        sync_handler = logging.StreamHandler(devnull)
+        sync_handler.setFormatter(legacy)
+        sync_logger = logging.Logger("benchmark.sync")
+        sync_logger.addHandler(sync_handler)
+
+        json_logger.stream_handler.setStream(devnull)
+        queue_logger = logging.Logger("benchmark.queue")
+        queue_logger.addHandler(json_logger.handler)
+
+        body = "долго везёте"
+        sync_rate = records_per_second(lambda idx: sync_logger.info("A request has been received with body: %s", body), records)
+        queue_rate = records_per_second(lambda idx: queue_logger.info("A request has been received with body: %s", body), records)
+        start = time.perf_counter()
+        json_logger.stop_listener()
+        drain_time = time.perf_counter() - start
+
+    print(f"{'logger.info() in caller':<28} {'records/sec':>12}")
+    print(f"{'legacy StreamHandler':<28} {sync_rate:>12.0f}")
+    print(f"{'JSONQueueHandler':<28} {queue_rate:>12.0f} ({queue_rate / sync_rate:.1f}x), queue drained in {drain_time:.2f} s")
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type = int, default = 50000)
+    args = parser.parse_args()
+    main(args.records)
@@ -0,0 +1,301 @@
+"""
+Набор бенчмарков стека инференса с проверкой регрессий относительно сохраненного baseline.
+
+Уровни (--layers):
+- micro  - core.data.preprocess, predict/predict_batch и explain_prediction по размерам батча и длинам текстов;
+- logger - JSONLogFormatter.format;
+- e2e    - нагрузка на приложение FastAPI, запущенное uvicorn в этом же процессе, с перебором числа
+           одновременных соединений: пропускная способность и p50/p95/p99 задержки /api/v1/predict_trends.
+
+Результаты сохраняются в JSON (--output) и сравниваются с baseline (--baseline): если метрика хуже
+baseline больше чем на --tolerance (--tail-tolerance для p95/p99), скрипт завершается с кодом 1. Baseline зависит от машины, поэтому
+на новой машине его нужно сначала записать с --save-baseline.
+
+Запуск:
+python backend/benchmarks/regression.py
+python backend/benchmarks/regression.py --layers micro logger --save-baseline
+python backend/benchmarks/regression.py --layers e2e --concurrency 1 8 32 --requests 2000 --tolerance 0.3
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import pathlib
+import platform
+import socket
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from corpus import BENCHMARKS_DIR, MAPPING_PATH, MODEL_PATH, make_corpus
+
+# кеш предсказаний отключается до импорта настроек сервиса: иначе e2e замерял бы попадания в кеш
+os.environ.setdefault("PREDICTION_CACHE_ENABLED", "false")
+
+from core import logger as json_logger  # noqa: E402
+from core.data import explain_prediction, load_mapping, load_model, predict, predict_batch, preprocess  # noqa: E402
+
+BASELINE_PATH = BENCHMARKS_DIR / "baseline.json"
+# длина текста - число фраз из corpus.make_corpus в одном отзыве
+TEXT_LENGTHS = {"short": (1, 1), "medium": (3, 5), "long": (15, 25)}
+
+Results = Dict[str, Dict[str, Any]]
+
+
+def metric(value: float, unit: str, better: str = "lower") -> Dict[str, Any]:
+    return {"value": value, "unit": unit, "better": better}
+
+
+def best_time(func: Callable[[], object], repeat: int, min_time: float = 0.02) -> float:
+    """Минимальное по repeat замерам время одного вызова; каждый замер длится не меньше min_time секунд,
+    чтобы быстрые функции не упирались в разрешение таймера."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed * 1.2))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def run_micro(batch_sizes: List[int], repeat: int) -> Results:
+    model = load_model(MODEL_PATH)
+    mapping = load_mapping(MAPPING_PATH)
+    results: Results = {}
+    for length, (min_phrases, max_phrases) in TEXT_LENGTHS.items():
+        for size in batch_sizes:
+            corpus = make_corpus(size, seed = size, min_phrases = min_phrases, max_phrases = max_phrases)
+            prefix = f"micro.{length}.batch_{size}"
+
+            elapsed = best_time(lambda: [preprocess(text) for text in corpus], repeat)
+            results[f"{prefix}.preprocess"] = metric(elapsed / size * 1e6, "us/item")
+
+            if size == 1:
+                elapsed = best_time(lambda: predict(corpus[0], model), repeat)
+            else:
+                elapsed = best_time(lambda: predict_batch(corpus, model), repeat)
+            results[f"{prefix}.predict"] = metric(elapsed / size * 1e6, "us/item")
+
+            prediction = predict_batch(corpus, model)
+            rows = [prediction[idx:idx + 1] for idx in range(size)]
+            elapsed = best_time(lambda: [explain_prediction(mapping, row) for row in rows], repeat)
+            results[f"{prefix}.explain_prediction"] = metric(elapsed / size * 1e6, "us/item")
+    return results
+
+
+def run_logger(records: int, repeat: int) -> Results:
+    formatter = json_logger.JSONLogFormatter()
+    batch = []
+    for idx in range(records):
+        record = logging.LogRecord("handlers.ml", logging.INFO, __file__, 42, "A request has been received with body: %s", (f"долго везёте {idx}",), None)
+        record.item_id = idx
+        batch.append(record)
+    elapsed = best_time(lambda: [formatter.format(record) for record in batch], repeat)
+    return {"logger.format": metric(elapsed / records * 1e6, "us/record")}
+
+
+class KeepAliveClient:
+    """Минимальный HTTP/1.1-клиент с постоянным соединением: накладные расходы клиента не должны
+    забирать у сервера процессорное время, которое он делит с ним в одном процессе."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Any = None
+        self._writer: Any = None
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def get_json(self, path: str, body: bytes) -> int:
+        self._writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        length = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        await self._reader.readexactly(length)
+        return status
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+def percentile(values: List[float], q: float) -> float:
+    return statistics.quantiles(values, n = 100, method = "inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+async def load_level(port: int, bodies: List[bytes], concurrency: int, requests: int) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+    clients = [KeepAliveClient("127.0.0.1", port) for _ in range(concurrency)]
+    await asyncio.gather(*[client.connect() for client in clients])
+
+    async def worker(client: KeepAliveClient) -> None:
+        nonlocal issued, errors
+        while issued < requests:
+            body = bodies[issued % len(bodies)]
+            issued += 1
+            start = time.perf_counter()
+            status = await client.get_json("/api/v1/predict_trends", body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    # прогрев: соединения, кеши аллокатора и ленивые импорты не должны попадать в замер
+    await asyncio.gather(*[client.get_json("/api/v1/predict_trends", bodies[0]) for client in clients])
+    started_at = time.perf_counter()
+    await asyncio.gather(*[worker(client) for client in clients])
+    elapsed = time.perf_counter() - started_at
+    await asyncio.gather(*[client.close() for client in clients])
+    return latencies, errors, elapsed
+
+
+def run_e2e(concurrency_levels: List[int], requests: int) -> Results:
+    import uvicorn
+
+    from main import create_app
+
+    # записи журнала форматируются как обычно, но не выводятся в консоль бенчмарка
+    devnull = open(os.devnull, "w")
+    json_logger.stream_handler.setStream(devnull)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(), log_level = "warning", access_log = False))
+    thread = threading.Thread(target = server.run, kwargs = {"sockets": [sock]}, daemon = True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Server failed to start")
+        time.sleep(0.05)
+
+    bodies = [json.dumps({"data": text}, ensure_ascii = False).encode("utf-8") for text in make_corpus(5000, seed = 7)]
+    results: Results = {}
+    try:
+        for concurrency in concurrency_levels:
+            latencies, errors, elapsed = asyncio.run(load_level(port, bodies, concurrency, requests))
+            prefix = f"e2e.predict_trends.c{concurrency}"
+            results[f"{prefix}.throughput"] = metric(len(latencies) / elapsed, "req/s", better = "higher")
+            for q in (50, 95, 99):
+                results[f"{prefix}.p{q}"] = metric(percentile(latencies, q) * 1000, "ms")
+            if errors > 0:
+                raise RuntimeError(f"{errors} of {len(latencies)} requests failed at concurrency {concurrency}")
+    finally:
+        server.should_exit = True
+        thread.join()
+        devnull.close()
+    return results
+
+
+def compare(results: Results, baseline: Results, tolerance: float, tail_tolerance: float) -> List[str]:
+    """Печатает сравнение с baseline и возвращает список метрик, ухудшившихся больше допустимого.
+
+    Для хвостовых перцентилей (p95, p99) допуск tail_tolerance, для остальных метрик - tolerance.
+    """
+    regressions = []
+    print(f"{'metric':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        if name not in baseline:
+            print(f"{name:<48} {'-':>12} {current['value']:>12.3f} {'new':>8}")
+            continue
+        expected = baseline[name]["value"]
+        change = (current["value"] - expected) / expected if expected else 0.0
+        allowed = tail_tolerance if name.endswith((".p95", ".p99")) else tolerance
+        worse = change > allowed if current["better"] == "lower" else change < -allowed
+        if worse:
+            regressions.append(name)
+        print(f"{name:<48} {expected:>12.3f} {current['value']:>12.3f} {change:>+7.1%}{' REGRESSION' if worse else ''}")
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "created_at": datetime.datetime.now().astimezone().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    results: Results = {}
+    if "micro" in args.layers:
+        results.update(run_micro(args.batch_sizes, args.repeat))
+    if "logger" in args.layers:
+        results.update(run_logger(args.records, args.repeat))
+    if "e2e" in args.layers:
+        results.update(run_e2e(args.concurrency, args.requests))
+    report = {"environment": environment(), "results": results}
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, ensure_ascii = False, indent = 2)
+
+    if args.save_baseline:
+        stored: Dict[str, Any] = {"environment": report["environment"], "results": {}}
+        if args.baseline.is_file():
+            with open(args.baseline, "r") as f:
+                stored["results"] = json.load(f)["results"]
+        stored["results"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, ensure_ascii = False, indent = 2)
+        print(f"{len(results)} results saved to {args.baseline}")
+        return None
+
+    if not args.baseline.is_file():
+        print(json.dumps(report, ensure_ascii = False, indent = 2))
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create it", file = sys.stderr)
+        return None
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    if baseline["environment"].get("cpu_count") != os.cpu_count():
+        print(f"Warning: baseline was recorded on {baseline['environment'].get('cpu_count')} CPUs", file = sys.stderr)
+    regressions = compare(results, baseline["results"], args.tolerance, args.tail_tolerance)
+    if regressions:
+        print(f"{len(regressions)} metrics are slower than the baseline beyond the tolerance", file = sys.stderr)
+        raise SystemExit(1)
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layers", nargs = "+", choices = ["micro", "logger", "e2e"], default = ["micro", "logger", "e2e"])
+    parser.add_argument("--batch-sizes", type = int, nargs = "+", default = [1, 10, 100, 1000])
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--records", type = int, default = 20000, help = "log records per logger measurement")
+    parser.add_argument("--concurrency", type = int, nargs = "+", default = [1, 4, 16, 64])
+    parser.add_argument("--requests", type = int, default = 2000, help = "requests per concurrency level")
+    parser.add_argument("--output", type = pathlib.Path, default = None, help = "where to save results as JSON")
+    parser.add_argument("--baseline", type = pathlib.Path, default = BASELINE_PATH)
+    parser.add_argument("--save-baseline", action = "store_true", help = "store the results as the new baseline")
+    parser.add_argument("--tolerance", type = float, default = 0.3, help = "allowed relative slowdown, 0.3 = 30%%")
+    parser.add_argument("--tail-tolerance", type = float, default = 0.5, help = "allowed relative slowdown of p95 and p99")
+    args = parser.parse_args()
+    if min(args.batch_sizes + args.concurrency) < 1 or args.repeat < 1 or args.requests < 1 or args.records < 1:
+        parser.error("sizes, counts and concurrency levels must be positive")
+    main(args)
@@ -0,0 +1,74 @@
+"""
+Сравнение CompactVocabulary с dict из TfidfVectorizer.vocabulary_: занимаемая память и стоимость поиска одной n-граммы.
+
+Запуск:
+python backend/benchmarks/vocabulary.py --size 2000
+"""
+import argparse
+import pickle
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from corpus import MODEL_PATH, make_corpus
+from core.scorer import compile_model
+from core.tfidf import char_wb_ngrams, features_from_vectorizer, ngram_keys
+from core.vocabulary import CompactVocabulary
+
+
+def allocated(build: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(size: int, repeat: int) -> None:
+    with open(MODEL_PATH, "rb") as f:
+        vectorizer = compile_model(pickle.load(f)).features
+    vocabulary: Dict[str, int] = vectorizer.vocabulary_
+    pairs = list(vocabulary.items())
+
+    # строки пересоздаются, чтобы учесть их память, а не только таблицу dict
+    dict_bytes = allocated(lambda: {term.encode("utf-8").decode("utf-8"): idx for term, idx in pairs})
+    compact = CompactVocabulary.from_dict(vocabulary)
+    print(f"terms: {len(vocabulary)}")
+    print(f"dict memory:    {dict_bytes / 1024:>10.1f} KiB")
+    print(f"compact memory: {compact.nbytes / 1024:>10.1f} KiB ({dict_bytes / compact.nbytes:.1f}x smaller)")
+
+    texts = make_corpus(size)
+    ngrams: List[str] = [ngram for text in texts for ngram in char_wb_ngrams(text.lower(), (1, 3))]
+    keys, _ = ngram_keys(texts, "char_wb", (1, 3), True)
+    dict_time = best_time(lambda: [vocabulary.get(ngram) for ngram in ngrams], repeat)
+    strings_time = best_time(lambda: compact.lookup(ngrams), repeat)
+    keys_time = best_time(lambda: compact.lookup_keys(keys), repeat)
+    print(f"lookups per run: {len(ngrams)}")
+    print(f"dict lookup:              {dict_time / len(ngrams) * 1e9:>8.1f} ns/ngram")
+    print(f"compact lookup (strings): {strings_time / len(ngrams) * 1e9:>8.1f} ns/ngram")
+    print(f"compact lookup (keys):    {keys_time / len(ngrams) * 1e9:>8.1f} ns/ngram (batched)")
+
+    corpus = make_corpus(size, seed = 3)
+    sklearn_time = best_time(lambda: vectorizer.transform(corpus), repeat)
+    compact_features = features_from_vectorizer(vectorizer, compact_vocabulary = True)
+    features_time = best_time(lambda: compact_features.transform(corpus), repeat)
+    print(f"transform of {size} texts: sklearn {sklearn_time * 1000:.1f} ms, compact {features_time * 1000:.1f} ms")
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type = int, default = 2000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+    main(args.size, args.repeat)
@@ -0,0 +1,115 @@
+"""
+Сравнение форматов тела пакетного скоринга: JSON и msgpack (см. core.codecs).
+
+Для каждого размера пакета замеряются размер тела, время кодирования и разбора запроса и ответа,
+а также разбор запроса на сервере: через модели PredictTrendsBatchRequest и PredictTrendsRequest
+(как в GET /api/v1/predict_trends/batch) и напрямую из байтов (как в POST-варианте).
+Ответ в JSON содержит описания меток, ответ в msgpack - только их индексы.
+
+Запуск:
+python backend/benchmarks/wire_format.py --batch-sizes 1 100 1000
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import msgpack
+from fastapi.encoders import jsonable_encoder
+
+from corpus import MAPPING_PATH, MODEL_PATH, make_corpus
+from core.data import explain_predictions, load_mapping, load_model, predict_batch, prediction_indices, render_trends_lists, serialize_mapping
+from schemas.predict_trends import PredictTrendsBatchItem, PredictTrendsBatchRequest, PredictTrendsBatchResponse, PredictTrendsRequest
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def parse_with_models(body: bytes) -> List[str]:
+    request = PredictTrendsBatchRequest.model_validate(json.loads(body))
+    return [PredictTrendsRequest.model_validate({"data": item}).data for item in request.data]
+
+
+def parse_raw(body: bytes, loads: Callable[[bytes], Any]) -> List[str]:
+    return [item.strip() for item in loads(body)["data"] if isinstance(item, str) and item.strip()]
+
+
+def render_with_models(mapping: Dict[str, List[str]], prediction: Any) -> bytes:
+    response = PredictTrendsBatchResponse(results = [PredictTrendsBatchItem(trends_list = item) for item in explain_predictions(mapping, prediction)])
+    return json.dumps(jsonable_encoder(response), ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+
+
+def render_json(fragments: Dict[int, bytes], prediction: Any) -> bytes:
+    return b'{"results":[' + b",".join(b'{"trends_list":' + item + b',"detail":null}' for item in render_trends_lists(fragments, prediction)) + b"]}"
+
+
+def render_msgpack(prediction: Any) -> bytes:
+    return msgpack.packb({"labels": prediction_indices(prediction), "errors": {}}, use_bin_type = True)
+
+
+def row(name: str, json_value: float, msgpack_value: float, unit: str) -> None:
+    ratio = json_value / msgpack_value if msgpack_value > 0 else float("inf")
+    print(f"  {name:<28} json {json_value:>10.1f} {unit:<3} msgpack {msgpack_value:>10.1f} {unit:<3} ({ratio:.1f}x)")
+
+
+def main(batch_sizes: List[int], repeat: int) -> None:
+    model = load_model(MODEL_PATH)
+    mapping = load_mapping(MAPPING_PATH)
+    fragments = serialize_mapping(mapping)
+    unpack = lambda body: msgpack.unpackb(body, raw = False)
+
+    for size in batch_sizes:
+        texts = make_corpus(size)
+        prediction = predict_batch(texts, model)
+        print(f"batch of {size}:")
+
+        payload = {"data": texts}
+        json_request = json.dumps(payload, ensure_ascii = False).encode("utf-8")
+        msgpack_request = msgpack.packb(payload, use_bin_type = True)
+        row("request size", len(json_request) / 1024, len(msgpack_request) / 1024, "KiB")
+        row(
+            "request encode",
+            best_time(lambda: json.dumps(payload, ensure_ascii = False).encode("utf-8"), repeat) * 1e6,
+            best_time(lambda: msgpack.packb(payload, use_bin_type = True), repeat) * 1e6,
+            "us"
+        )
+        models_parse = best_time(lambda: parse_with_models(json_request), repeat) * 1e6
+        row(
+            "request parse (raw)",
+            best_time(lambda: parse_raw(json_request, json.loads), repeat) * 1e6,
+            best_time(lambda: parse_raw(msgpack_request, unpack), repeat) * 1e6,
+            "us"
+        )
+        print(f"  {'request parse (models)':<28} json {models_parse:>10.1f} us")
+
+        json_response = render_json(fragments, prediction)
+        msgpack_response = render_msgpack(prediction)
+        row("response size", len(json_response) / 1024, len(msgpack_response) / 1024, "KiB")
+        row(
+            "response encode",
+            best_time(lambda: render_json(fragments, prediction), repeat) * 1e6,
+            best_time(lambda: render_msgpack(prediction), repeat) * 1e6,
+            "us"
+        )
+        print(f"  {'response encode (models)':<28} json {best_time(lambda: render_with_models(mapping, prediction), repeat) * 1e6:>10.1f} us")
+        row(
+            "response decode",
+            best_time(lambda: json.loads(json_response), repeat) * 1e6,
+            best_time(lambda: unpack(msgpack_response), repeat) * 1e6,
+            "us"
+        )
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", nargs = "+", type = int, default = [1, 100, 1000])
+    parser.add_argument("--repeat", type = int, default = 20)
+    args = parser.parse_args()
+    main(args.batch_sizes, args.repeat)
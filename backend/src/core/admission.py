@@ -0,0 +1,170 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import math
+import time
+from typing import Any, AsyncIterator, Deque, Dict, Union
+
+from core import metrics
+
+# причины отказа: метка метрики admission_rejections_total и статус ответа
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+
+# дедлайн обслуживаемого запроса (момент по time.perf_counter()), задается на время AdmissionController.admit
+deadline_var: contextvars.ContextVar[Union[float, None]] = contextvars.ContextVar("deadline", default = None)
+
+
+class AdmissionRejected(Exception):
+    """Запрос отклонен до инференса; retry_after - рекомендуемая пауза перед повтором в секундах."""
+
+    def __init__(self, reason: str, retry_after: Union[int, None] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def check_deadline(deadline: Union[float, None] = None) -> None:
+    """Бросает AdmissionRejected(DEADLINE_EXCEEDED), если дедлайн (по умолчанию - текущего запроса) уже наступил.
+
+    Вызывается непосредственно перед инференсом (core.executor, core.batching): запрос мог получить слот
+    вовремя, но дождаться модели уже после своего дедлайна, и тогда ответ на него никому не нужен.
+    """
+    if deadline is None:
+        deadline = deadline_var.get()
+    if deadline is not None and time.perf_counter() >= deadline:
+        raise AdmissionRejected(DEADLINE_EXCEEDED)
+    return None
+
+
+class AdmissionController:
+    """Ограничивает число одновременно обслуживаемых запросов и длину очереди ожидания.
+
+    Запрос занимает один из max_in_flight слотов; если свободных нет, он ждет в FIFO-очереди не дольше
+    queue_timeout секунд и не дольше своего дедлайна. Когда очередь заполнена, запрос отклоняется сразу:
+    при перегрузке лишние запросы получают быстрый отказ вместо ожидания, которое клиент не дождется,
+    а слоты тратятся только на запросы, ответ на которые еще кому-то нужен.
+    Освобожденный слот передается первому ожидающему напрямую, поэтому новые запросы не обгоняют очередь.
+
+    Контроллер не потокобезопасен и рассчитан на использование из цикла событий одного процесса.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be positive")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        # сглаженное время обслуживания запроса, по нему оценивается Retry-After
+        self._service_time = 0.0
+        self._rejections = {
+            reason: metrics.admission_rejections_total.labels(reason) for reason in (QUEUE_FULL, QUEUE_TIMEOUT, DEADLINE_EXCEEDED)
+        }
+        self._queue_seconds = metrics.admission_queue_seconds.labels()
+        # статистика:
+        self.admitted = 0
+        self.rejected: Dict[str, int] = collections.defaultdict(int)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def saturated(self, queue_ratio: float = 1.0) -> bool:
+        """Все слоты заняты, а очередь ожидания заполнена не меньше чем на долю queue_ratio."""
+        return self.in_flight >= self.max_in_flight and len(self._waiters) >= math.ceil(queue_ratio * self.max_queue)
+
+    def retry_after(self) -> int:
+        """Оценка времени до освобождения места в очереди, в целых секундах (не меньше 1)."""
+        return max(1, math.ceil((len(self._waiters) + 1) * self._service_time / self.max_in_flight))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        self._rejections[reason].inc()
+        return AdmissionRejected(reason, self.retry_after() if reason != DEADLINE_EXCEEDED else None)
+
+    async def _wait(self, deadline: Union[float, None]) -> None:
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject(QUEUE_FULL)
+        started_at = time.perf_counter()
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - started_at)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            expired = deadline is not None and time.perf_counter() >= deadline
+            raise self._reject(DEADLINE_EXCEEDED if expired else QUEUE_TIMEOUT) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # слот уже передан этому запросу, но клиент ушел: отдаем слот следующему
+                self._release()
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            self._queue_seconds.observe(time.perf_counter() - started_at)
+        return None
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        # отмененный future мог быть уже пропущен и удален из очереди в _release
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+        return None
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return None
+        self.in_flight -= 1
+        return None
+
+    @contextlib.asynccontextmanager
+    async def admit(self, deadline: Union[float, None] = None) -> AsyncIterator[None]:
+        """Занимает слот на время блока; deadline - момент по time.perf_counter(), после которого ответ не нужен.
+
+        Бросает AdmissionRejected, если очередь заполнена, ожидание слота превысило queue_timeout
+        или дедлайн наступил раньше, чем запрос получил слот. Внутри блока дедлайн доступен через deadline_var.
+        """
+        if deadline is not None and deadline <= time.perf_counter():
+            raise self._reject(DEADLINE_EXCEEDED)
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+        else:
+            await self._wait(deadline)
+        self.admitted += 1
+        started_at = time.perf_counter()
+        token = deadline_var.set(deadline)
+        try:
+            yield
+        except AdmissionRejected as exc:
+            # дедлайн наступил, пока запрос ждал инференса (см. check_deadline)
+            if exc.reason == DEADLINE_EXCEEDED:
+                self.rejected[DEADLINE_EXCEEDED] += 1
+                self._rejections[DEADLINE_EXCEEDED].inc()
+            raise
+        finally:
+            deadline_var.reset(token)
+            self._service_time += 0.2 * (time.perf_counter() - started_at - self._service_time)
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "service_time_ms": round(self._service_time * 1000, 3),
+        }
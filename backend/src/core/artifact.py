@@ -0,0 +1,170 @@
+"""
+Формат артефакта модели без pickle.
+
+Артефакт - это версионированная директория:
+
+<root>/<version>/
+    manifest.json         - версия формата, версия модели и параметры векторизатора;
+    idf.npy               - вектор idf;
+    coef.npy              - матрица коэффициентов (n_features, n_labels);
+    intercept.npy         - вектор свободных членов (n_labels,);
+    classes.npy           - классы бинарных классификаторов (n_labels, 2);
+    vocabulary.npy        - отсортированные n-граммы словаря в UTF-8 (байтовые строки фиксированной ширины);
+    vocabulary_index.npy  - индексы признаков для n-грамм из vocabulary.npy;
+    vocabulary_keys.npy, vocabulary_keys_index.npy - тот же словарь в виде CompactVocabulary
+                            (есть, если n-граммы не длиннее core.vocabulary.MAX_KEY_CHARS символов);
+    mapping.json          - описание меток (необязательно).
+
+Массивы загружаются через np.load(mmap_mode="r"), поэтому несколько процессов на одном узле используют
+одни и те же физические страницы, а загрузка не требует импорта sklearn и не зависит от его версии.
+"""
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from core.scorer import LinearScorer
+from core.tfidf import TfidfFeatures
+from core.vocabulary import MAX_KEY_CHARS, CompactVocabulary
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+MAPPING_FILE = "mapping.json"
+
+
+def is_artifact(path: Union[str, pathlib.Path]) -> bool:
+    return (pathlib.Path(path) / MANIFEST_FILE).is_file()
+
+
+def file_version(path: Union[str, pathlib.Path]) -> str:
+    """Версия модели по содержимому файла: первые 12 символов sha256."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def export_artifact(model: Any, output_dir: Union[str, pathlib.Path], version: str,
+                    mapping: Union[Dict[str, List[str]], None] = None) -> pathlib.Path:
+    """Сохраняет обученный Pipeline с TfidfVectorizer и MultiOutputClassifier(LogisticRegression) в директорию output_dir/version.
+
+    Директория сначала собирается во временной папке и затем атомарно переименовывается,
+    поэтому наблюдатели за output_dir никогда не увидят частично записанную версию.
+    """
+    import sklearn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    from core.scorer import compile_model
+
+    scorer = compile_model(model)
+    vectorizer = scorer.features
+    if not isinstance(vectorizer, TfidfVectorizer):
+        raise TypeError("Only pipelines with a single TfidfVectorizer over the text column can be exported")
+    if vectorizer.analyzer not in ("char_wb", "char") or vectorizer.preprocessor is not None \
+            or vectorizer.strip_accents is not None or vectorizer.binary or not vectorizer.use_idf:
+        raise ValueError("Only char and char_wb TfidfVectorizer with default preprocessing and idf can be exported")
+    if np.dtype(vectorizer.dtype) != np.float64:
+        # core.tfidf.TfidfFeatures всегда строит признаки в float64
+        raise ValueError(f"Only float64 TfidfVectorizer can be exported, got {np.dtype(vectorizer.dtype)}")
+
+    terms = list(vectorizer.vocabulary_.keys())
+    if any("\x00" in term for term in terms):
+        raise ValueError("Vocabulary terms with NUL characters can not be stored in a fixed-width array")
+    encoded = np.array([term.encode("utf-8") for term in terms])
+    order = np.argsort(encoded, kind = "stable")
+    feature_index = np.array([vectorizer.vocabulary_[term] for term in terms], dtype = np.int32)
+
+    output_dir = pathlib.Path(output_dir)
+    target = output_dir / version
+    if target.exists():
+        raise FileExistsError(f"Model version {version} already exists in {output_dir}")
+    staging = output_dir / f".{version}.tmp"
+    shutil.rmtree(staging, ignore_errors = True)
+    staging.mkdir(parents = True)
+
+    np.save(staging / "idf.npy", np.ascontiguousarray(vectorizer.idf_, dtype = np.float64))
+    np.save(staging / "coef.npy", scorer.coef)
+    np.save(staging / "intercept.npy", scorer.intercept)
+    np.save(staging / "classes.npy", scorer.classes)
+    np.save(staging / "vocabulary.npy", encoded[order])
+    np.save(staging / "vocabulary_index.npy", feature_index[order])
+    if max(vectorizer.ngram_range) <= MAX_KEY_CHARS:
+        compact = CompactVocabulary.from_dict(vectorizer.vocabulary_)
+        np.save(staging / "vocabulary_keys.npy", compact.keys)
+        np.save(staging / "vocabulary_keys_index.npy", compact.feature_index)
+    if mapping is not None:
+        with open(staging / MAPPING_FILE, "w") as f:
+            json.dump(mapping, f, ensure_ascii = False)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "created_at": datetime.datetime.now().astimezone().isoformat(),
+        "sklearn_version": sklearn.__version__,
+        "features": {
+            "analyzer": vectorizer.analyzer,
+            "ngram_range": list(vectorizer.ngram_range),
+            "lowercase": bool(vectorizer.lowercase),
+            "norm": vectorizer.norm,
+            "sublinear_tf": bool(vectorizer.sublinear_tf),
+            "n_features": int(len(vectorizer.idf_)),
+        },
+        "n_labels": scorer.n_labels,
+    }
+    with open(staging / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, ensure_ascii = False, indent = 2)
+
+    os.replace(staging, target)
+    return target
+
+
+def load_manifest(path: Union[str, pathlib.Path]) -> Dict[str, Any]:
+    with open(pathlib.Path(path) / MANIFEST_FILE, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format: {manifest.get('format_version')}")
+    return manifest
+
+
+def load_artifact(path: Union[str, pathlib.Path], compact_vocabulary: bool = True) -> LinearScorer:
+    """Собирает LinearScorer из директории артефакта; массивы отображаются в память только для чтения.
+
+    При compact_vocabulary (если артефакт содержит vocabulary_keys.npy) словарь ищется бинарным
+    поиском прямо по отображенным в память массивам, иначе строится обычный dict.
+    """
+    path = pathlib.Path(path)
+    manifest = load_manifest(path)
+    params = manifest["features"]
+
+    if compact_vocabulary and (path / "vocabulary_keys.npy").is_file():
+        vocabulary = CompactVocabulary(
+            np.load(path / "vocabulary_keys.npy", mmap_mode = "r"),
+            np.load(path / "vocabulary_keys_index.npy", mmap_mode = "r")
+        )
+    else:
+        terms = np.load(path / "vocabulary.npy", mmap_mode = "r")
+        feature_index = np.load(path / "vocabulary_index.npy", mmap_mode = "r")
+        vocabulary = dict(zip((term.decode("utf-8") for term in terms.tolist()), feature_index.tolist()))
+
+    features = TfidfFeatures(
+        vocabulary,
+        np.load(path / "idf.npy", mmap_mode = "r"),
+        analyzer = params["analyzer"],
+        ngram_range = tuple(params["ngram_range"]),
+        lowercase = params["lowercase"],
+        norm = params["norm"],
+        sublinear_tf = params["sublinear_tf"]
+    )
+    return LinearScorer(
+        features,
+        np.load(path / "coef.npy", mmap_mode = "r"),
+        np.load(path / "intercept.npy", mmap_mode = "r"),
+        np.load(path / "classes.npy", mmap_mode = "r"),
+        version = manifest["version"]
+    )
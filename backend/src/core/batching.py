@@ -0,0 +1,146 @@
+import asyncio
+import collections
+import time
+from typing import Awaitable, Callable, Deque, Dict, List, Set, Tuple, Union, Any
+
+import numpy as np
+
+from core.admission import DEADLINE_EXCEEDED, AdmissionRejected, deadline_var
+
+
+BatchRunner = Callable[[List[str]], Awaitable[np.ndarray]]
+
+
+class MicroBatcher:
+    """Динамический micro-batching одиночных запросов к модели.
+
+    Запросы складываются в очередь, которая сбрасывается в модель одним векторизованным вызовом,
+    как только в ней набирается max_batch_size элементов или с момента появления первого элемента
+    проходит max_wait_ms миллисекунд. Каждый вызывающий получает свою строку матрицы предсказаний
+    через собственный future, поэтому при свободном слоте добавленная задержка ограничена max_wait_ms.
+    Одновременно в модели находится не больше max_concurrent_batches батчей.
+    Запросы, дедлайн которых (core.admission.deadline_var) наступил, пока они ждали в очереди,
+    в батч не попадают и получают AdmissionRejected(DEADLINE_EXCEEDED).
+    """
+
+    def __init__(self, runner: BatchRunner, max_batch_size: int, max_wait_ms: float, max_concurrent_batches: int = 1):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be positive")
+        if max_concurrent_batches < 1:
+            raise ValueError("max_concurrent_batches must be positive")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._runner = runner
+        self._pending: Deque[Tuple[str, asyncio.Future, Union[float, None]]] = collections.deque()
+        self._has_items = asyncio.Event()
+        self._is_full = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_concurrent_batches)
+        self._flushes: Set[asyncio.Task] = set()
+        self._collector: Union[asyncio.Task, None] = None
+        self._closing = False
+        # статистика:
+        self._batches = 0
+        self._items = 0
+        self._max_batch_size_seen = 0
+        self._batch_size_histogram: Dict[int, int] = collections.defaultdict(int)
+
+    async def start(self) -> None:
+        if self._collector is None:
+            self._closing = False
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+        return None
+
+    async def stop(self) -> None:
+        """Останавливает планировщик, предварительно обработав все уже принятые запросы."""
+        if self._collector is None:
+            return None
+        self._closing = True
+        self._has_items.set()
+        self._is_full.set()
+        await self._collector
+        self._collector = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions = True)
+        return None
+
+    async def submit(self, data: str) -> np.ndarray:
+        """Ставит текст в очередь и возвращает предсказание для него в виде матрицы из одной строки."""
+        if self._collector is None or self._closing:
+            raise RuntimeError("MicroBatcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((data, future, deadline_var.get()))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._is_full.set()
+        return await future
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight_batches": len(self._flushes),
+            "batches": self._batches,
+            "items": self._items,
+            "mean_batch_size": round(self._items / self._batches, 2) if self._batches > 0 else 0.0,
+            "max_batch_size": self._max_batch_size_seen,
+            # ключ - верхняя граница корзины (степень двойки), значение - число батчей
+            "batch_size_histogram": {str(bound): count for bound, count in sorted(self._batch_size_histogram.items())},
+        }
+
+    async def _collect(self) -> None:
+        while not (self._closing and not self._pending):
+            await self._has_items.wait()
+            if len(self._pending) < self.max_batch_size and not self._closing:
+                try:
+                    await asyncio.wait_for(self._is_full.wait(), timeout = self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            # слот занимается до извлечения батча: пока все слоты заняты, запросы остаются в очереди,
+            # дополняют следующий батч и могут быть отменены вызывающими
+            await self._slots.acquire()
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+            if not self._pending and not self._closing:
+                self._has_items.clear()
+            if len(self._pending) < self.max_batch_size and not self._closing:
+                self._is_full.clear()
+            # отмененные вызывающими запросы и запросы с истекшим дедлайном не отправляем в модель
+            now = time.perf_counter()
+            for _, future, deadline in batch:
+                if deadline is not None and now >= deadline and not future.done():
+                    future.set_exception(AdmissionRejected(DEADLINE_EXCEEDED))
+            batch = [(data, future) for data, future, _ in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            self._observe(len(batch))
+            task = asyncio.get_running_loop().create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        return None
+
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            prediction = await self._runner([data for data, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for idx, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(prediction[idx:idx + 1])
+        finally:
+            self._slots.release()
+        return None
+
+    def _observe(self, batch_size: int) -> None:
+        self._batches += 1
+        self._items += batch_size
+        self._max_batch_size_seen = max(self._max_batch_size_seen, batch_size)
+        self._batch_size_histogram[1 << (batch_size - 1).bit_length()] += 1
+        return None
@@ -0,0 +1,182 @@
+import asyncio
+import collections
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, OrderedDict, Tuple, Type, TypeVar, Union
+
+import numpy as np
+
+from core import metrics
+
+T = TypeVar("T")
+
+
+def normalize_text(data: str) -> str:
+    """Нормализация текста перед хешированием: та же обрезка пробелов, что и str_strip_whitespace в BaseSchema."""
+    return data.strip()
+
+
+def text_key(data: str) -> bytes:
+    return hashlib.blake2b(normalize_text(data).encode("utf-8", "surrogatepass"), digest_size = 16).digest()
+
+
+class PredictionCache:
+    """Ограниченный LRU-кеш предсказаний модели с временем жизни записей.
+
+    Ключ записи - хеш нормализованного текста отзыва (см. text_key), значение - строка матрицы
+    предсказаний. Кеш привязан к версии модели: при обращении с другой версией все записи удаляются,
+    поэтому после смены модели старые предсказания не возвращаются.
+
+    Кеш не потокобезопасен и рассчитан на использование из цикла событий одного процесса.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: Union[float, None] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        if ttl_seconds is not None and ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict[bytes, Tuple[float, np.ndarray]] = collections.OrderedDict()
+        self._version: Hashable = None
+        # статистика:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: Hashable) -> None:
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+        return None
+
+    def get(self, data: str, version: Hashable) -> Union[np.ndarray, None]:
+        self._check_version(version)
+        key = text_key(data)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, prediction = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return prediction
+
+    def put(self, data: str, version: Hashable, prediction: np.ndarray) -> None:
+        self._check_version(version)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        # копия строки, чтобы запись не удерживала всю матрицу батча
+        prediction = np.array(prediction, copy = True)
+        prediction.flags.writeable = False
+        key = text_key(data)
+        self._entries[key] = (expires_at, prediction)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+        return None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        return None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "model_version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / requests, 4) if requests > 0 else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# результат вызова, после которого ожидающие повторяют вычисление сами: ведущий вызов был отменен
+# или завершился исключением из retry_on
+_RETRY = object()
+
+
+class SingleFlight:
+    """Объединение одновременных одинаковых вычислений.
+
+    Первый вызов do() с ключом (ведущий) выполняет compute() в собственной корутине, а вызовы с тем же ключом,
+    пришедшие до его завершения, ждут future, который ведущий разрешает своим результатом (или исключением).
+    Это закрывает окно, когда записи в PredictionCache еще нет, а одинаковые тексты уже массово пришли на инференс.
+    Вычисление остается в задаче ведущего запроса, поэтому его контекст (correlation_id, профилирование
+    core.profiling) относится к этому запросу. Если ведущий вызов отменен (клиент отключился) или завершился
+    исключением из retry_on, которое касается только его запроса (например, истек дедлайн ведущего запроса,
+    см. core.admission), ожидающие не получают его, а повторяют вычисление: первый из них становится новым ведущим.
+
+    Не потокобезопасен: ключи хранятся в цикле событий процесса, вычисление может выполняться в любом пуле.
+    """
+
+    def __init__(self, retry_on: Tuple[Type[BaseException], ...] = ()):
+        self.retry_on = retry_on
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._coalesced_total = metrics.predictions_coalesced_total.labels()
+        # статистика:
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+            self._coalesced_total.inc()
+        while call is not None:
+            # shield: отмена ожидающего не должна отменять общий future
+            result = await asyncio.shield(call)
+            if result is not _RETRY:
+                return result
+            call = self._calls.get(key)
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        try:
+            result = await compute()
+        except self.retry_on:
+            call.set_result(_RETRY)
+            raise
+        except Exception as exc:
+            call.set_exception(exc)
+            # исключение забирается здесь, даже если ожидающих нет
+            call.exception()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            if not call.done():
+                # ведущий вызов отменен
+                call.set_result(_RETRY)
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / self.calls, 4) if self.calls > 0 else 0.0,
+        }
@@ -0,0 +1,90 @@
+"""
+Форматы тела запроса и ответа ML-ручек: JSON (по умолчанию) и msgpack.
+
+Формат запроса определяется заголовком Content-Type, формат ответа - заголовком Accept.
+В msgpack предсказания передаются компактно: индексами меток вместо их описаний, а описание меток
+текущей версии модели отдает /api/v1/predict_trends/labels (версия - в заголовке X-Model-Version).
+msgpack - необязательная зависимость: без него поддерживается только JSON.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# у msgpack нет единственного зарегистрированного типа, поэтому принимаются все распространенные варианты
+MSGPACK_MEDIA_TYPES = frozenset({MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack"})
+# диапазоны Accept, которым соответствует JSON
+JSON_MEDIA_RANGES = frozenset({JSON_MEDIA_TYPE, "application/*", "*/*"})
+
+
+class UnsupportedMediaType(ValueError):
+    pass
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def _media_type(value: str) -> str:
+    return value.split(";", 1)[0].strip().lower()
+
+
+def request_media_type(content_type: Union[str, None]) -> str:
+    """Формат тела запроса по Content-Type; без заголовка тело считается JSON."""
+    if not content_type:
+        return JSON_MEDIA_TYPE
+    media_type = _media_type(content_type)
+    if media_type == JSON_MEDIA_TYPE or media_type.endswith("+json"):
+        return JSON_MEDIA_TYPE
+    if media_type in MSGPACK_MEDIA_TYPES and msgpack is not None:
+        return MSGPACK_MEDIA_TYPE
+    raise UnsupportedMediaType(f"Unsupported content type: {media_type}")
+
+
+def response_media_type(accept: Union[str, None]) -> str:
+    """Формат ответа по Accept: поддерживаемый тип с наибольшим q, при равном q - указанный раньше.
+
+    Без заголовка, без поддерживаемых типов в нем или без установленного msgpack ответ отдается в JSON.
+    """
+    if not accept or msgpack is None:
+        return JSON_MEDIA_TYPE
+    best, best_q = JSON_MEDIA_TYPE, 0.0
+    for media_range in accept.split(","):
+        media_type, _, params = media_range.partition(";")
+        media_type = media_type.strip().lower()
+        if media_type in MSGPACK_MEDIA_TYPES:
+            candidate = MSGPACK_MEDIA_TYPE
+        elif media_type in JSON_MEDIA_RANGES:
+            candidate = JSON_MEDIA_TYPE
+        else:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = candidate, q
+    return best
+
+
+def decode(body: bytes, media_type: str) -> Any:
+    """Разбирает тело запроса; при некорректном теле бросает ValueError."""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        try:
+            return msgpack.unpackb(body, raw = False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ValueError(f"Invalid msgpack body: {exc}") from exc
+    return json.loads(body)
+
+
+def encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, use_bin_type = True)
@@ -1,16 +1,63 @@
-from typing import Any, Tuple, Dict, List
-import pandas as pd
+from typing import TYPE_CHECKING, Any, Tuple, Dict, List, Union
+import json
+import pathlib
+import pickle
 import numpy as np
 
-from sklearn.pipeline import Pipeline
+from core.artifact import file_version, is_artifact, load_artifact
+from core.scorer import LinearScorer, compile_model
+from core.tfidf import features_from_vectorizer
+from core.vocabulary import CompactVocabulary
 
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+
+def load_model(path: Union[str, pathlib.Path], compile: bool = True, compact_vocabulary: bool = True) -> Union["Pipeline", LinearScorer]:
+    """Загружает модель из директории артефакта (см. core.artifact) или из pickle-файла с пайплайном sklearn.
+
+    Пайплайн из pickle по умолчанию компилируется в LinearScorer. При compact_vocabulary словарь
+    TF-IDF хранится в CompactVocabulary, а исходный dict векторизатора освобождается вместе с пайплайном.
+    """
+    if is_artifact(path):
+        return load_artifact(path, compact_vocabulary = compact_vocabulary)
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    if not compile:
+        return model
+    scorer = compile_model(model, version = file_version(path))
+    if compact_vocabulary:
+        try:
+            features = features_from_vectorizer(scorer.features)
+        except ValueError:
+            # векторизатор не поддерживается core.tfidf, остаемся на sklearn
+            return scorer
+        # со словарем на dict (n-граммы длиннее MAX_KEY_CHARS) core.tfidf считает n-граммы в цикле Python
+        # и ничего не экономит, поэтому векторизатор sklearn заменяется только на CompactVocabulary
+        if isinstance(features.vocabulary, CompactVocabulary):
+            scorer.features = features
+    return scorer
+
+def load_mapping(path: Union[str, pathlib.Path]) -> Dict[str, List[str]]:
+    with open(path, 'r') as f:
+        return json.load(f)
 
 def preprocess(data: Any)-> str:
     return str(data)
 
-def predict(data: str, model: Pipeline) -> np.ndarray:
+def predict(data: str, model: Union["Pipeline", LinearScorer]) -> np.ndarray:
+
+    return predict_batch([data], model)
+
+def predict_batch(data: List[str], model: Union["Pipeline", LinearScorer]) -> np.ndarray:
+
+    if isinstance(model, LinearScorer):
+        # быстрый путь: векторизатор получает список строк без построения DataFrame
+        return model.predict(data)
 
-    prediction = model.predict(pd.DataFrame(columns = ["text"], data = [data]))
+    import pandas as pd
+
+    prediction = model.predict(pd.DataFrame(columns = ["text"], data = data))
 
     return np.array(prediction)
 
@@ -19,4 +66,40 @@ def explain_prediction(mapping: Dict[str, List[str]], prediction: np.ndarray)->
     indices = np.where(prediction == 1)
     for idx in indices[1].tolist():
         result.append(mapping[str(idx)])
-    return result
\ No newline at end of file
+    return result
+
+def explain_predictions(mapping: Dict[str, List[str]], prediction: np.ndarray)-> List[List[List[str]]]:
+    rows, columns = np.nonzero(prediction == 1)
+    bounds = np.searchsorted(rows, np.arange(prediction.shape[0] + 1)).tolist()
+    explains = [mapping[str(idx)] for idx in columns.tolist()]
+    return [explains[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+def serialize_mapping(mapping: Dict[str, List[str]]) -> Dict[int, bytes]:
+    """Заранее сериализует описание каждой метки в JSON-фрагмент для render_trends_response.
+
+    Строки обрезаются так же, как при валидации PredictTrendsResponse (str_strip_whitespace в BaseSchema),
+    а JSON кодируется с теми же параметрами, что и в JSONResponse, поэтому ответ совпадает побайтово.
+    """
+    return {
+        int(idx): json.dumps([value.strip() for value in trend], ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+        for idx, trend in mapping.items()
+    }
+
+def render_trends_lists(fragments: Dict[int, bytes], prediction: np.ndarray) -> List[bytes]:
+    """Сериализует trends_list каждой строки матрицы предсказаний из заранее подготовленных фрагментов меток."""
+    rows, columns = np.nonzero(prediction == 1)
+    bounds = np.searchsorted(rows, np.arange(prediction.shape[0] + 1)).tolist()
+    parts = [fragments[idx] for idx in columns.tolist()]
+    return [b"[" + b",".join(parts[start:end]) + b"]" for start, end in zip(bounds[:-1], bounds[1:])]
+
+def prediction_indices(prediction: np.ndarray) -> List[List[int]]:
+    """Индексы предсказанных меток каждой строки матрицы предсказаний (компактный ответ, см. core.codecs)."""
+    rows, columns = np.nonzero(prediction == 1)
+    bounds = np.searchsorted(rows, np.arange(prediction.shape[0] + 1)).tolist()
+    indices = columns.tolist()
+    return [indices[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+def render_trends_response(fragments: Dict[int, bytes], prediction: np.ndarray) -> bytes:
+    """Собирает тело ответа PredictTrendsResponse из фрагментов предсказанных меток без повторной сериализации."""
+    indices = np.nonzero(prediction == 1)[1].tolist()
+    return b'{"trends_list":[' + b",".join([fragments[idx] for idx in indices]) + b"]}"
@@ -0,0 +1,135 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import multiprocessing
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Literal, Sequence, Union
+
+import numpy as np
+
+from core.admission import DEADLINE_EXCEEDED, AdmissionRejected, check_deadline, deadline_var
+from core.data import predict_batch
+from core.logger import JSONLogger, correlation_id_var
+
+logger = JSONLogger(__name__)
+
+
+ExecutionBackend = Literal["inline", "thread", "process"]
+
+# модель процесса-воркера, задается один раз в initializer пула
+_worker_model: Any = None
+
+
+def _init_worker(model: Any, loader: Union[Callable[[], Any], None], warmup: Sequence[str] = ()) -> None:
+    # при fork модель уже находится в памяти процесса и делится с родителем через copy-on-write,
+    # loader нужен только для методов запуска без fork, где воркер загружает модель сам
+    global _worker_model
+    _worker_model = model if loader is None else loader()
+    # каждый процесс пула, в том числе пересозданный после сбоя, прогревается до первого запроса
+    if len(warmup) > 0:
+        predict_batch(list(warmup), _worker_model)
+    return None
+
+
+def _predict_before_deadline(data: List[str], model: Any) -> np.ndarray:
+    # запрос мог дождаться свободного потока пула уже после своего дедлайна
+    check_deadline()
+    return predict_batch(data, model)
+
+
+def _predict_in_worker(data: List[str], correlation_id: str = "", expires_at: Union[float, None] = None) -> np.ndarray:
+    # часы time.perf_counter() не сравнимы между процессами, поэтому дедлайн передается по time.time()
+    if expires_at is not None and time.time() >= expires_at:
+        raise AdmissionRejected(DEADLINE_EXCEEDED)
+    # контекст не передается в другой процесс, поэтому correlation_id запроса привязывается заново
+    token = JSONLogger.bind_correlation_id(correlation_id)
+    try:
+        return predict_batch(data, _worker_model)
+    finally:
+        JSONLogger.flush_correlation_id(token)
+
+
+def _ping() -> bool:
+    return _worker_model is not None
+
+
+class InferenceExecutor:
+    """Исполняет CPU-bound инференс вне цикла событий asyncio.
+
+    Поддерживаются три режима:
+    - inline: предсказание выполняется прямо в цикле событий (поведение по умолчанию);
+    - thread: в пуле потоков, цикл событий остается отзывчивым во время инференса;
+    - process: в пуле процессов, что позволяет масштабировать пропускную способность по ядрам.
+      Процессы создаются через fork и используют уже загруженную модель родителя; только если fork
+      недоступен, каждый процесс загружает модель сам через loader. Если процесс пула погибает
+      (OOM, segfault), пул пересоздается, а запрос повторяется один раз. Каждый процесс при запуске
+      прогоняет через модель корпус warmup, чтобы первый запрос к нему не платил за ленивую инициализацию.
+    """
+
+    def __init__(self, backend: ExecutionBackend, model: Any, loader: Callable[[], Any], workers: int = 1,
+                 warmup: Sequence[str] = ()):
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self.backend = backend
+        self.workers = workers if backend != "inline" else 1
+        self._model = model
+        self._loader = loader
+        self._warmup = warmup
+        self._pool: Union[concurrent.futures.Executor, None] = None
+        if backend == "thread":
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "inference")
+        elif backend == "process":
+            self._pool = self._create_process_pool()
+        elif backend != "inline":
+            raise ValueError(f"Unknown inference backend: {backend}")
+
+    def _create_process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context, initargs = multiprocessing.get_context("fork"), (self._model, None, self._warmup)
+        else:
+            mp_context, initargs = multiprocessing.get_context("spawn"), (None, self._loader, self._warmup)
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers = self.workers,
+            mp_context = mp_context,
+            initializer = _init_worker,
+            initargs = initargs
+        )
+
+    async def start(self) -> None:
+        """Запускает процессы пула заранее, чтобы загрузка модели не попала на первые запросы."""
+        if self.backend == "process":
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)])
+        return None
+
+    async def predict(self, data: List[str]) -> np.ndarray:
+        """Предсказание для data; если у запроса истек дедлайн (core.admission.deadline_var), в том числе
+        пока он ждал свободного потока или процесса пула, бросает AdmissionRejected(DEADLINE_EXCEEDED)."""
+        check_deadline()
+        if self.backend == "inline":
+            return predict_batch(data, self._model)
+        loop = asyncio.get_running_loop()
+        if self.backend == "thread":
+            # run_in_executor не копирует контекст, без этого записи журнала из пула потеряли бы correlation_id,
+            # а проверка дедлайна - сам дедлайн
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._pool, context.run, _predict_before_deadline, data, self._model)
+        pool = self._pool
+        correlation_id = correlation_id_var.get()
+        deadline = deadline_var.get()
+        expires_at = time.time() + (deadline - time.perf_counter()) if deadline is not None else None
+        try:
+            return await loop.run_in_executor(pool, _predict_in_worker, data, correlation_id, expires_at)
+        except BrokenProcessPool:
+            # сломанный пул отклоняет все последующие задачи, поэтому заменяем его новым
+            if self._pool is pool:
+                logger.warning("Inference process pool is broken, restarting it")
+                pool.shutdown(wait = False, cancel_futures = True)
+                self._pool = self._create_process_pool()
+            return await loop.run_in_executor(self._pool, _predict_in_worker, data, correlation_id, expires_at)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait = wait, cancel_futures = True)
+        return None
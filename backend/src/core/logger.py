@@ -8,32 +8,31 @@
 4) Перехвата warning независимо от того, в каком фрагменте кода они возникли.
 
 ВАЖНО: 
-Концепция связывания логов работает для синхронного выполнения кода, а также выполнения кода в многопоточном или
-мультипроцессорном режиме. Для асинхронного выполнения кода correlation_id необходимо передавать вручную каждый раз
-при создании записи в журнале логирования. Минусом такого способа задания correlation_id является то, что мы не сможем 
-связывать логи, которые генерируют сторонние модули.
-
-TODO:
-1) correlation_id_dict сделать переменной класса JSONLogFormatter и управлять им через класс JSONLogger.
-   Эту задачу можно также реализовать через переопределение метода logging.Logger.makeRecord в классе JSONLogger.
-   Пример:
-   https://stackoverflow.com/questions/59176101/extract-the-extra-fields-in-logging-call-in-log-formatter
+correlation_id хранится в контекстной переменной correlation_id_var (contextvars), поэтому связывание логов
+работает как для синхронного и многопоточного кода, так и для асинхронного: у каждой задачи asyncio своя копия
+контекста, и конкурентные запросы в одном потоке не перезаписывают correlation_id друг друга. В пул потоков
+контекст нужно передавать явно (contextvars.copy_context().run), в пул процессов - значение correlation_id.
 """
+import atexit
+import copy
 import functools
+import os
+import queue
 import sys
-import threading
 import time
 import uuid
 import datetime
 import json
 import logging
+import logging.handlers
 import contextlib
+import contextvars
 
 from pydantic import BaseModel
 from typing import Union, Dict, Any, Callable
 
-global handler, formatter, correlation_id_dict
-correlation_id_dict: Dict[str, str] = {}
+global handler, formatter, listener
+correlation_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("correlation_id", default = "")
 
 class JsonLogSchema(BaseModel):
     """Форма записи в JSON формате для ведения логов.
@@ -61,11 +60,37 @@ class JsonLogSchema(BaseModel):
     # поля для отладки:
     debug_info: Union[Dict[str, Any], None] = None
 
+# наборы ключей вычисляются один раз, а не для каждой записи:
+DEBUG_INFO_KEYS = ("threadName", "name", "module", "lineno", "exc_info", "exc_text", "stack_info")
+PREDEFINED_KEYS = frozenset(["name", "msg", "args", "levelname", "levelno", "pathname", "filename", "module",
+                             "lineno", "exc_info", "exc_text", "stack_info", "funcName", "created", "msecs", "relativeCreated",
+                             "thread", "threadName", "processName", "process"] + list(JsonLogSchema.__dict__.keys()))
+# служебный атрибут, в котором JSONQueueHandler передает correlation_id, определенный в момент создания записи
+CORRELATION_ID_ATTRIBUTE = "_correlation_id"
+EXCLUDED_EXTRA_KEYS = PREDEFINED_KEYS | {CORRELATION_ID_ATTRIBUTE}
+
 class JSONLogFormatter(logging.Formatter):
-    
+    """Форматирует запись в JSON по схеме JsonLogSchema.
+
+    Для скорости словарь записи собирается напрямую в порядке полей JsonLogSchema, без создания модели pydantic,
+    а часовой пояс для written_at кешируется на минуту (смещение меняется только при переходе на летнее время).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timezone_cache: tuple = (None, None)
+
     def format(self, record: logging.LogRecord, *args, **kwargs) -> str:
         log_object: dict = self._format_log_object(record, *args, **kwargs)
         return json.dumps(log_object, ensure_ascii = False)
+
+    def _local_timezone(self, created: float) -> datetime.tzinfo:
+        minute = int(created // 60)
+        cached_minute, timezone = self._timezone_cache
+        if minute != cached_minute:
+            timezone = datetime.datetime.fromtimestamp(created).astimezone().tzinfo
+            self._timezone_cache = (minute, timezone)
+        return timezone
     
     def _format_log_object(self, record: logging.LogRecord, *args, **kwargs) -> dict:
         """Перевод записи объекта журнала в json формат с необходимым перечнем полей.
@@ -80,50 +105,78 @@ class JSONLogFormatter(logging.Formatter):
         однако логика нам немного не подходит, поэтому реализовали по-своему.
 
         correlation_id может быть присвоен записи в двух случаях:
-        - если до создания записи в журнале была вызвана bind_correlation_id();
+        - если до создания записи в журнале была вызвана bind_correlation_id() (в том же контексте);
         - если в при создании записи через параметр extra был передан словарь с ключем correlation_id.
         Во всех остальных случаях correlation_id останется пустым.
         """
 
-        global correlation_id_dict
-
-        debug_info_keys = ["threadName", "name", "module", "lineno", "exc_info", "exc_text", "stack_info"]        
-        predefined_keys = ["name", "msg", "args", "levelname", "levelno", "pathname", "filename", "module",  
-                           "lineno", "exc_info", "exc_text", "stack_info", "funcName", "created", "msecs", "relativeCreated", 
-                           "thread", "threadName", "processName", "process"] + list(JsonLogSchema.__dict__.keys())
-        extra_keys = [key for key in record.__dict__.keys() if key not in predefined_keys and record.__dict__[key] is not None]
-        thread = str(record.threadName)
-        if thread in correlation_id_dict.keys():
-            correlation_id = correlation_id_dict[thread]
-        elif hasattr(record, "correlation_id"):
-            correlation_id = str(record.__dict__["correlation_id"])
+        attributes = record.__dict__
+        if CORRELATION_ID_ATTRIBUTE in attributes:
+            correlation_id = attributes[CORRELATION_ID_ATTRIBUTE]
+        elif correlation_id_var.get():
+            correlation_id = correlation_id_var.get()
+        elif "correlation_id" in attributes:
+            correlation_id = str(attributes["correlation_id"])
         else:
             correlation_id = ""
 
-        # Инициализация тела журнала
-        json_log_fields = JsonLogSchema(
-            correlation_id = correlation_id,
-            msg = str(record.getMessage()),
-            level = str(record.levelname),            
-            id = str(record.__dict__["id"]) if hasattr(record, "id") else "",
-            parent_id = str(record.__dict__["parent_id"]) if hasattr(record, "parent_id") else "",
-            user_id = str(record.__dict__["user_id"]) if hasattr(record, "user_id") else "",
-            item_id = str(record.__dict__["item_id"]) if hasattr(record, "item_id") else "",
-            merchant_id = str(record.__dict__["merchant_id"]) if hasattr(record, "merchant_id") else "",
-            content_type = str(record.__dict__["content_type"]) if hasattr(record, "content_type") else "",
-            written_at = str(datetime.datetime.fromtimestamp(record.created).astimezone().replace().isoformat()),
-            extra = {key: str(record.__dict__[key]) if record.__dict__[key] is not None else None for key in extra_keys},
-            debug_info = {key: str(record.__dict__[key]) if record.__dict__[key] is not None else None for key in debug_info_keys}
-            )
-        
-        # Преобразование Pydantic объекта в словарь
-        json_log_object = json_log_fields.__dict__
+        # тело журнала в порядке полей JsonLogSchema
+        return {
+            "correlation_id": correlation_id,
+            "written_at": datetime.datetime.fromtimestamp(record.created, self._local_timezone(record.created)).isoformat(),
+            "msg": str(record.getMessage()),
+            "level": str(record.levelname),
+            "id": str(attributes["id"]) if "id" in attributes else "",
+            "parent_id": str(attributes["parent_id"]) if "parent_id" in attributes else "",
+            "user_id": str(attributes["user_id"]) if "user_id" in attributes else "",
+            "item_id": str(attributes["item_id"]) if "item_id" in attributes else "",
+            "merchant_id": str(attributes["merchant_id"]) if "merchant_id" in attributes else "",
+            "content_type": str(attributes["content_type"]) if "content_type" in attributes else "",
+            "extra": {key: str(value) for key, value in attributes.items() if key not in EXCLUDED_EXTRA_KEYS and value is not None},
+            "debug_info": {key: str(attributes[key]) if attributes[key] is not None else None for key in DEBUG_INFO_KEYS},
+        }
+
+class JSONQueueHandler(logging.handlers.QueueHandler):
+    """Передает записи в очередь, из которой их форматирует и пишет в stdout поток QueueListener.
+
+    В отличие от стандартного QueueHandler, запись не форматируется целиком в вызывающем потоке:
+    сразу подставляются только аргументы сообщения (они могут измениться позже) и correlation_id
+    (он привязан к контексту вызывающего кода), а exc_info сохраняется, как и при синхронной записи.
+    """
 
-        return json_log_object
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        correlation_id = correlation_id_var.get()
+        if correlation_id:
+            setattr(record, CORRELATION_ID_ATTRIBUTE, correlation_id)
+        return record
 
-handler = logging.StreamHandler(sys.stdout)
 formatter = JSONLogFormatter()
-handler.setFormatter(formatter)
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(formatter)
+handler = JSONQueueHandler(queue.SimpleQueue())
+listener = logging.handlers.QueueListener(handler.queue, stream_handler)
+listener.start()
+
+def stop_listener() -> None:
+    """Дописывает все записи из очереди; вызывается автоматически при выходе и вручную перед os._exit()."""
+    global listener
+    if listener._thread is not None:
+        listener.stop()
+    return None
+
+def _restart_listener() -> None:
+    # поток QueueListener не переживает fork, поэтому дочерний процесс запускает свой с новой очередью
+    global listener
+    handler.queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(handler.queue, stream_handler)
+    listener.start()
+    return None
+
+atexit.register(stop_listener)
+os.register_at_fork(after_in_child = _restart_listener)
 
 class JSONLogger(logging.Logger):
     """Класс JSONLogger предназначен для ведения журнала в виде JSON-объектов.
@@ -143,34 +196,26 @@ class JSONLogger(logging.Logger):
         self._redirector = contextlib.redirect_stdout(self)  # type: ignore
 
     @classmethod
-    def bind_correlation_id(cls) -> None:
-        """Позволяет потокобезопасно связать несколько запросов между собой с помощью uuid.
-        
-        В контексте связывания логов сервисов, построенных на FastAPI, предполагается, что
-        функция bind_correlation_id() будет вызываться в Middleware-функции: 
-        https://fastapi.tiangolo.com/tutorial/middleware/ 
-        
-        Для безопасного использования correlation_id должна использоваться функция flush_correlation_id(),
-        которая должна вызываться в обработчике ручки.
+    def bind_correlation_id(cls, correlation_id: Union[str, None] = None) -> contextvars.Token:
+        """Связывает записи текущего контекста с correlation_id (по умолчанию - новый uuid).
 
-        При асинхронном выполнении программы correlation_id не будет нести своей смысловой нагрузки.
+        В сервисах на FastAPI bind_correlation_id() вызывается в middleware (см. core.middleware), и все записи,
+        созданные при обработке запроса, в том числе в задачах asyncio, получают один correlation_id.
+        Возвращает токен, по которому flush_correlation_id() восстанавливает предыдущее значение.
         """
-        global correlation_id_dict
-
-        thread_name = threading.current_thread().name
-        correlation_id_dict[thread_name] = str(uuid.uuid1())
-        return None
+        return correlation_id_var.set(correlation_id if correlation_id is not None else str(uuid.uuid1()))
 
     @classmethod
-    def flush_correlation_id(cls) -> None:
+    def flush_correlation_id(cls, token: Union[contextvars.Token, None] = None) -> None:
         """Позволяет удалить correlation_id.
 
-        Это безопасный вариант использования correlation_id, но не всегда является обязательным использование
-        этой функции, если использование одного и того же correlation_id повторно не подразумевается кодом.
+        С токеном из bind_correlation_id() восстанавливает значение, бывшее до связывания, иначе просто
+        очищает correlation_id текущего контекста.
         """
-        thread_name = threading.current_thread().name
-        if thread_name in correlation_id_dict.keys():
-            del correlation_id_dict[thread_name]
+        if token is not None:
+            correlation_id_var.reset(token)
+        else:
+            correlation_id_var.set("")
         return None
 
     def write(self, msg):
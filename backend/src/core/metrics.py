@@ -0,0 +1,233 @@
+"""
+Метрики сервиса в памяти процесса и их выгрузка в текстовом формате Prometheus.
+
+Наблюдения не используют блокировок и не пишут в журнал: счетчики - это обычные атрибуты объектов,
+которые изменяются из цикла событий asyncio одного процесса, а выгрузка только читает их. В режиме
+нескольких воркеров (см. main.run_workers) у каждого процесса свои метрики.
+"""
+import asyncio
+import bisect
+import contextvars
+import functools
+import math
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Tuple, Union
+
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+
+# границы корзин гистограмм задержек, в секундах
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Response сама добавляет "; charset=utf-8" к текстовым типам
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class HistogramValue:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # корзина le - первая граница, не меньшая value; последняя корзина - +Inf
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """Семейство метрик Prometheus с фиксированным набором меток.
+
+    labels() возвращает значение для конкретного набора меток; его стоит получить один раз
+    и сохранить, чтобы на каждое наблюдение не тратить поиск в словаре.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        if kind not in ("counter", "gauge", "histogram"):
+            raise ValueError(f"Unsupported metric type: {kind}")
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Union[CounterValue, HistogramValue]] = {}
+
+    def labels(self, *label_values: str) -> Any:
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        value = self._values.get(label_values)
+        if value is None:
+            value = HistogramValue(self.buckets) if self.kind == "histogram" else CounterValue()
+            value = self._values.setdefault(label_values, value)
+        return value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in list(self._values.items()):
+            labels = [f'{name}="{escape_label(label)}"' for name, label in zip(self.label_names, label_values)]
+            if isinstance(value, HistogramValue):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), list(value.counts)):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    bucket_labels = ",".join(labels + [f'le="{le}"'])
+                    lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+                suffix = "{" + ",".join(labels) + "}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {value.sum!r}")
+                lines.append(f"{self.name}_count{suffix} {cumulative}")
+            else:
+                suffix = "{" + ",".join(labels) + "}" if labels else ""
+                lines.append(f"{self.name}{suffix} {value.value!r}")
+        return lines
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+stage_seconds = Metric(
+    "predict_trends_stage_seconds", "Time spent in each stage of a predict_trends request", "histogram", ("stage",)
+)
+request_seconds = Metric("http_request_duration_seconds", "HTTP request handling time", "histogram", ("route",))
+requests_total = Metric("http_requests_total", "Handled HTTP requests", "counter", ("route", "status"))
+requests_in_flight = Metric("http_requests_in_flight", "HTTP requests being handled", "gauge", ("route",))
+request_errors_total = Metric(
+    "http_request_errors_total", "HTTP requests failed with an unhandled exception or a 5xx status", "counter", ("route",)
+)
+
+admission_rejections_total = Metric(
+    "admission_rejections_total", "Requests rejected by admission control before inference", "counter", ("reason",)
+)
+admission_queue_seconds = Metric("admission_queue_seconds", "Time spent waiting for an admission slot", "histogram")
+predictions_coalesced_total = Metric(
+    "predictions_coalesced_total", "predict_trends requests served by an identical prediction already in flight", "counter"
+)
+
+registry: List[Metric] = [
+    stage_seconds, request_seconds, requests_total, requests_in_flight, request_errors_total,
+    admission_rejections_total, admission_queue_seconds, predictions_coalesced_total
+]
+
+# стадии обработки запроса, см. handlers.ml
+validation_seconds = stage_seconds.labels("validation")
+preprocess_seconds = stage_seconds.labels("preprocess")
+predict_seconds = stage_seconds.labels("predict")
+explain_seconds = stage_seconds.labels("explain")
+serialization_seconds = stage_seconds.labels("serialization")
+
+
+def render_metrics() -> bytes:
+    lines: List[str] = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# отметки времени текущего запроса: [начало, вызов обработчика, возврат из обработчика,
+# время валидации внутри обработчика (см. observe_validation)]
+_request_timestamps: contextvars.ContextVar[List[float]] = contextvars.ContextVar("request_timestamps")
+
+
+class InstrumentedAPIRoute(APIRoute):
+    """APIRoute, который считает запросы, ошибки и запросы в обработке и замеряет стадии вокруг обработчика.
+
+    Время от получения запроса до вызова обработчика (чтение тела, разбор JSON, валидация и зависимости)
+    записывается в стадию validation, время от возврата из обработчика до готового ответа - в serialization.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint) and not getattr(endpoint, "__instrumented__", False):
+            self.dependant.call = instrument_endpoint(endpoint)
+        route_handler = super().get_route_handler()
+        duration = request_seconds.labels(self.path)
+        in_flight = requests_in_flight.labels(self.path)
+        errors = request_errors_total.labels(self.path)
+        statuses: Dict[int, CounterValue] = {}
+        path = self.path
+
+        async def instrumented_route_handler(request: Request) -> Response:
+            timestamps = [time.perf_counter(), 0.0, 0.0, 0.0]
+            token = _request_timestamps.set(timestamps)
+            in_flight.inc()
+            status_code = 500
+            try:
+                response = await route_handler(request)
+                status_code = response.status_code
+                return response
+            except HTTPException as exc:
+                status_code = exc.status_code
+                raise
+            except RequestValidationError:
+                status_code = 422
+                raise
+            finally:
+                finished_at = time.perf_counter()
+                _request_timestamps.reset(token)
+                in_flight.dec()
+                duration.observe(finished_at - timestamps[0])
+                if timestamps[1] > 0.0:
+                    validation_seconds.observe(timestamps[1] - timestamps[0] + timestamps[3])
+                elif status_code == 422:
+                    validation_seconds.observe(finished_at - timestamps[0])
+                if timestamps[2] > 0.0:
+                    serialization_seconds.observe(finished_at - timestamps[2])
+                counter = statuses.get(status_code)
+                if counter is None:
+                    counter = statuses.setdefault(status_code, requests_total.labels(path, str(status_code)))
+                counter.inc()
+                if status_code >= 500:
+                    errors.inc()
+
+        return instrumented_route_handler
+
+
+def observe_validation(seconds: float) -> None:
+    """Учитывает валидацию, выполненную в самом обработчике (например, поэлементную валидацию пакета).
+
+    Внутри запроса время добавляется к стадии validation этого запроса, чтобы на запрос приходилось
+    одно наблюдение; вне его (тело потокового ответа) записывается отдельным наблюдением.
+    """
+    timestamps = _request_timestamps.get(None)
+    if timestamps is None:
+        validation_seconds.observe(seconds)
+    else:
+        timestamps[3] += seconds
+    return None
+
+
+def instrument_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    """Отмечает моменты вызова обработчика и возврата из него для InstrumentedAPIRoute."""
+
+    @functools.wraps(endpoint)
+    async def instrumented_endpoint(*args: Any, **kwargs: Any) -> Any:
+        timestamps = _request_timestamps.get(None)
+        if timestamps is not None:
+            timestamps[1] = time.perf_counter()
+        result = await endpoint(*args, **kwargs)
+        if timestamps is not None:
+            timestamps[2] = time.perf_counter()
+        return result
+
+    instrumented_endpoint.__instrumented__ = True  # type: ignore
+    return instrumented_endpoint
@@ -0,0 +1,116 @@
+import time
+from typing import Iterable, Union
+
+from starlette import status
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.admission import DEADLINE_EXCEEDED, QUEUE_FULL, QUEUE_TIMEOUT, AdmissionRejected
+from core.logger import JSONLogger, correlation_id_var
+
+MAX_CORRELATION_ID_LENGTH = 128
+
+
+def valid_correlation_id(value: str) -> bool:
+    return 0 < len(value) <= MAX_CORRELATION_ID_LENGTH and value.isascii() and value.isprintable()
+
+
+class CorrelationIdMiddleware:
+    """Связывает все записи журнала, созданные при обработке запроса, одним correlation_id.
+
+    correlation_id берется из заголовка запроса header_name (если он задан и корректен) или генерируется
+    заново, записывается в контекстную переменную core.logger.correlation_id_var и возвращается в том же
+    заголовке ответа. Middleware написан на чистом ASGI, а не через BaseHTTPMiddleware: так обработчик
+    выполняется в том же контексте, и после ответа значение переменной восстанавливается, не перетекая
+    в следующий запрос.
+    """
+
+    def __init__(self, app: ASGIApp, header_name: str = "X-Correlation-ID"):
+        self.app = app
+        self.header_name = header_name
+        self._header_key = header_name.lower().encode("latin-1")
+
+    def _incoming_id(self, scope: Scope) -> Union[str, None]:
+        for key, value in scope["headers"]:
+            if key == self._header_key:
+                correlation_id = value.decode("latin-1").strip()
+                return correlation_id if valid_correlation_id(correlation_id) else None
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return None
+
+        token = JSONLogger.bind_correlation_id(self._incoming_id(scope))
+        correlation_id = correlation_id_var.get()
+
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope = message)[self.header_name] = correlation_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            JSONLogger.flush_correlation_id(token)
+        return None
+
+
+# статусы ответа на запросы, отклоненные контролем допуска
+REJECTION_STATUSES = {
+    QUEUE_FULL: status.HTTP_429_TOO_MANY_REQUESTS,
+    QUEUE_TIMEOUT: status.HTTP_503_SERVICE_UNAVAILABLE,
+    DEADLINE_EXCEEDED: status.HTTP_504_GATEWAY_TIMEOUT,
+}
+
+
+class AdmissionMiddleware:
+    """Контроль допуска (core.admission.AdmissionController из app.state.admission) для запросов к paths.
+
+    Решение принимается до чтения тела запроса, его разбора и валидации, поэтому отказ при перегрузке
+    почти ничего не стоит серверу. Дедлайн запроса задается заголовком header_name: оставшееся у клиента
+    время в миллисекундах, отсчитанное от момента, когда запрос дошел до приложения. Дедлайн проверяется
+    и после допуска, непосредственно перед инференсом (core.admission.check_deadline): запрос, не дождавшийся
+    модели вовремя, получает тот же ответ 504.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str], header_name: str = "X-Request-Timeout-Ms"):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.header_name = header_name
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        admission = scope["app"].state.admission if scope["type"] == "http" and scope["path"] in self.paths else None
+        if admission is None:
+            await self.app(scope, receive, send)
+            return None
+
+        received_at = time.perf_counter()
+        deadline = None
+        value = Headers(scope = scope).get(self.header_name)
+        if value is not None:
+            try:
+                timeout_ms = float(value)
+            except ValueError:
+                timeout_ms = float("nan")
+            if not timeout_ms >= 0:
+                response = JSONResponse(
+                    {"detail": f"{self.header_name} must be a non-negative number of milliseconds"},
+                    status_code = status.HTTP_400_BAD_REQUEST
+                )
+                await response(scope, receive, send)
+                return None
+            deadline = received_at + timeout_ms / 1000
+
+        try:
+            async with admission.admit(deadline):
+                await self.app(scope, receive, send)
+        except AdmissionRejected as exc:
+            headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+            response = JSONResponse(
+                {"detail": f"Request is rejected: {exc.reason}"}, status_code = REJECTION_STATUSES[exc.reason], headers = headers
+            )
+            await response(scope, receive, send)
+        return None
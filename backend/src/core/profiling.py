@@ -0,0 +1,109 @@
+import cProfile
+import io
+import pstats
+import time
+import types
+from typing import Any, Coroutine, Dict, Generator, Union
+
+
+@types.coroutine
+def _profile_steps(coro: Coroutine[Any, Any, Any], profile: cProfile.Profile) -> Generator[Any, Any, Any]:
+    """Выполняет корутину, включая профилировщик только на время ее собственных шагов.
+
+    Пока корутина ждет (ввод-вывод, пул инференса), цикл событий выполняет другие запросы,
+    и они не попадают в профиль выбранного запроса.
+    """
+    value: Any = None
+    error: Union[BaseException, None] = None
+    while True:
+        profile.enable()
+        try:
+            yielded = coro.send(value) if error is None else coro.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            profile.disable()
+        try:
+            value, error = (yield yielded), None
+        except BaseException as exc:
+            value, error = None, exc
+
+
+class RequestProfiler:
+    """Профилирование реальных запросов по требованию: cProfile для одного из каждых sample_every запросов.
+
+    Профилирование включается на ограниченное окно времени (start), профили выбранных запросов
+    суммируются, а report() возвращает текстовый отчет pstats по самым горячим функциям.
+    В выключенном состоянии обработчик проверяет только атрибут active.
+
+    Инференс, вынесенный в пул потоков или процессов (INFERENCE_BACKEND), выполняется вне
+    профилируемого потока и в отчет не попадает; для профиля модели используйте backend inline.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.sample_every = 1
+        self.started_at: Union[float, None] = None
+        self.deadline = 0.0
+        self._seen = 0
+        self._sampled = 0
+        self._stats: Union[pstats.Stats, None] = None
+
+    def start(self, sample_every: int, duration_seconds: float) -> None:
+        if sample_every < 1:
+            raise ValueError("sample_every must be positive")
+        if duration_seconds <= 0:
+            raise ValueError("duration_seconds must be positive")
+        self.sample_every = sample_every
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + duration_seconds
+        self._seen = 0
+        self._sampled = 0
+        self._stats = None
+        self.active = True
+        return None
+
+    def stop(self) -> None:
+        self.active = False
+        return None
+
+    async def run(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        """Выполняет обработку запроса, профилируя ее, если запрос попал в выборку."""
+        if time.monotonic() > self.deadline:
+            self.active = False
+        self._seen += 1
+        if not self.active or self._seen % self.sample_every != 0:
+            return await coro
+
+        profile = cProfile.Profile()
+        try:
+            return await _profile_steps(coro, profile)
+        finally:
+            profile.create_stats()
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._sampled += 1
+
+    def status(self) -> Dict[str, Any]:
+        if self.active and time.monotonic() > self.deadline:
+            self.active = False
+        return {
+            "active": self.active,
+            "sample_every": self.sample_every,
+            "started_at": self.started_at,
+            "seconds_left": round(max(self.deadline - time.monotonic(), 0.0), 3) if self.active else 0.0,
+            "requests_seen": self._seen,
+            "requests_sampled": self._sampled,
+        }
+
+    def report(self, sort: str = "cumulative", limit: int = 50) -> str:
+        status = self.status()
+        header = "".join(f"# {key}: {value}\n" for key, value in status.items())
+        if self._stats is None:
+            return header + "# no requests have been sampled\n"
+        stream = io.StringIO()
+        self._stats.stream = stream
+        self._stats.sort_stats(sort).print_stats(limit)
+        return header + stream.getvalue()
@@ -0,0 +1,200 @@
+import asyncio
+import contextlib
+import json
+import pathlib
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Set, Union
+
+from core.artifact import MANIFEST_FILE, load_manifest
+from core.batching import MicroBatcher
+from core.data import serialize_mapping
+from core.executor import InferenceExecutor
+from core.logger import JSONLogger
+
+logger = JSONLogger(__name__)
+
+
+class Deployment:
+    """Загруженная версия модели вместе со всем, что от нее зависит: описанием меток, фрагментами
+    ответа, исполнителем инференса и планировщиком micro-batching.
+
+    Обработчик берет Deployment один раз на запрос (ModelRegistry.acquire) и использует только его,
+    поэтому предсказание и описание меток в ответе всегда относятся к одной версии.
+    """
+
+    def __init__(self, version: str, model: Any, mapping: Dict[str, List[str]], executor: InferenceExecutor,
+                 batcher: Union[MicroBatcher, None] = None):
+        self.version = version
+        self.model = model
+        self.mapping = mapping
+        self.trend_fragments = serialize_mapping(mapping)
+        self.executor = executor
+        self.batcher = batcher
+        self.in_flight = 0
+        self.retired = False
+        # результат прогрева (см. core.warmup)
+        self.warmup: Dict[str, Any] = {"rounds": 0, "p95_ms": None, "stable_rounds": 0, "settled": False}
+        self._drained = asyncio.Event()
+
+    @property
+    def warmed(self) -> bool:
+        return bool(self.warmup["settled"])
+
+    async def start(self) -> None:
+        await self.executor.start()
+        if self.batcher is not None:
+            await self.batcher.start()
+        return None
+
+    async def stop(self) -> None:
+        if self.batcher is not None:
+            await self.batcher.stop()
+        self.executor.shutdown()
+        return None
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        if self.retired and self.in_flight == 0:
+            self._drained.set()
+        return None
+
+    async def drain(self) -> None:
+        """Ждет завершения всех запросов, начатых на этой версии, и освобождает ее ресурсы."""
+        self.retired = True
+        if self.in_flight > 0:
+            await self._drained.wait()
+        await self.stop()
+        return None
+
+
+DeploymentBuilder = Callable[[pathlib.Path], Awaitable[Deployment]]
+DeploymentHook = Callable[[Deployment], None]
+
+
+def list_versions(root: Union[str, pathlib.Path]) -> List[pathlib.Path]:
+    """Директории версий артефакта модели в root от старых к новым (по created_at из манифеста).
+
+    Незавершенные версии (скрытые временные директории export_artifact) пропускаются.
+    """
+    versions = []
+    for path in pathlib.Path(root).iterdir():
+        if path.name.startswith(".") or not (path / MANIFEST_FILE).is_file():
+            continue
+        try:
+            versions.append((load_manifest(path).get("created_at", ""), path.name, path))
+        except (OSError, ValueError, json.JSONDecodeError):
+            continue
+    return [path for _, _, path in sorted(versions)]
+
+
+class ModelRegistry:
+    """Реестр версий модели с горячей заменой без остановки сервиса.
+
+    Новая версия загружается и прогревается в фоне (builder), затем одним присваиванием становится
+    текущей: между запросами цикла событий, поэтому ни один запрос не видит промежуточного состояния.
+    Предыдущая версия продолжает обслуживать начатые на ней запросы и освобождается, когда они завершатся.
+    Замену запускает watch() при появлении новой версии в директории реестра или вызов deploy().
+    """
+
+    def __init__(self, builder: DeploymentBuilder, on_deploy: Union[DeploymentHook, None] = None):
+        self._builder = builder
+        self._on_deploy = on_deploy
+        self._current: Union[Deployment, None] = None
+        self._lock = asyncio.Lock()
+        self._draining: Set[Deployment] = set()
+        self._drain_tasks: Set[asyncio.Task] = set()
+        self.source: Union[pathlib.Path, None] = None
+
+    @property
+    def current(self) -> Deployment:
+        if self._current is None:
+            raise RuntimeError("No model is deployed")
+        return self._current
+
+    @contextlib.contextmanager
+    def acquire(self) -> Iterator[Deployment]:
+        deployment = self.current
+        deployment.in_flight += 1
+        try:
+            yield deployment
+        finally:
+            deployment._release()
+
+    async def deploy(self, path: Union[str, pathlib.Path]) -> Deployment:
+        """Загружает версию модели из path и делает ее текущей; старая версия освобождается после дренажа."""
+        path = pathlib.Path(path)
+        async with self._lock:
+            deployment = await self._builder(path)
+            previous = self._current
+            if previous is not None and not deployment.warmed:
+                # непрогретая версия сделала бы сервис неготовым, поэтому остается текущая
+                await deployment.stop()
+                raise RuntimeError(f"Model version {deployment.version} latency has not settled during warm-up")
+            self._current = deployment
+            self.source = path
+            if self._on_deploy is not None:
+                self._on_deploy(deployment)
+            logger.warning(
+                "Model version %s is deployed", deployment.version,
+                extra = {"model_version": deployment.version, "previous_version": previous.version if previous else None}
+            )
+            if previous is not None:
+                previous.retired = True
+                self._draining.add(previous)
+                task = asyncio.get_running_loop().create_task(self._drain(previous))
+                self._drain_tasks.add(task)
+                task.add_done_callback(self._drain_tasks.discard)
+        return deployment
+
+    async def _drain(self, deployment: Deployment) -> None:
+        try:
+            await deployment.drain()
+            logger.info("Model version %s is released", deployment.version, extra = {"model_version": deployment.version})
+        finally:
+            self._draining.discard(deployment)
+        return None
+
+    async def watch(self, root: Union[str, pathlib.Path], interval: float) -> None:
+        """Раз в interval секунд разворачивает самую новую версию из директории реестра, если появилась новая.
+
+        Реагирует только на смену самой новой версии, поэтому версия, развернутая вручную (например, откат
+        через deploy()), остается текущей до появления следующей версии в реестре.
+        """
+        newest = self.source
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                versions = await asyncio.to_thread(list_versions, root)
+            except OSError as exc:
+                logger.warning("Model registry %s is not readable: %s", root, exc)
+                continue
+            if not versions or versions[-1] == newest:
+                continue
+            # неудачную версию не пробуем повторно, пока не появится следующая
+            newest = versions[-1]
+            try:
+                await self.deploy(newest)
+            except Exception:
+                logger.exception("Model version %s can not be deployed", newest.name)
+
+    async def stop(self) -> None:
+        if self._drain_tasks:
+            await asyncio.gather(*self._drain_tasks, return_exceptions = True)
+        if self._current is not None:
+            await self._current.stop()
+            self._current = None
+        return None
+
+    @property
+    def in_flight(self) -> int:
+        """Число запросов, которые обслуживают текущая и заменяемые версии."""
+        current = self._current.in_flight if self._current is not None else 0
+        return current + sum(item.in_flight for item in self._draining)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._current.version if self._current is not None else None,
+            "warmup": self._current.warmup if self._current is not None else None,
+            "source": str(self.source) if self.source is not None else None,
+            "in_flight": self._current.in_flight if self._current is not None else 0,
+            "draining": [{"version": item.version, "in_flight": item.in_flight} for item in self._draining],
+        }
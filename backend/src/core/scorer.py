@@ -0,0 +1,114 @@
+from typing import TYPE_CHECKING, Any, List, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+
+class FrameFeatures:
+    """Адаптер произвольного препроцессора пайплайна к списку текстов через DataFrame с одной колонкой.
+
+    Используется, только если векторизатор нельзя извлечь из пайплайна напрямую.
+    """
+
+    def __init__(self, preprocessor: Any, column: str = "text"):
+        self.preprocessor = preprocessor
+        self.column = column
+
+    def transform(self, data: List[str]) -> Any:
+        import pandas as pd
+
+        return self.preprocessor.transform(pd.DataFrame(columns = [self.column], data = data))
+
+
+class DenseFeatures:
+    """Обертка над векторизатором, повторяющая уплотнение выхода ColumnTransformer при sparse_output_ = False."""
+
+    def __init__(self, vectorizer: Any):
+        self.vectorizer = vectorizer
+
+    def transform(self, data: List[str]) -> np.ndarray:
+        return self.vectorizer.transform(data).toarray()
+
+
+class LinearScorer:
+    """Скомпилированный вариант пайплайна Pipeline(preprocessor, MultiOutputClassifier(LogisticRegression)).
+
+    Коэффициенты всех бинарных логистических регрессий уложены в одну матрицу coef размером
+    (n_features, n_labels) и вектор intercept, поэтому предсказание всех меток - это одно
+    произведение разреженной матрицы признаков на плотную матрицу и порог по нулю, вместо
+    n_labels отдельных вызовов predict с их проверками входных данных.
+
+    Признаки строит features - объект с методом transform, принимающим обычный список текстов
+    (как правило, обученный TfidfVectorizer, извлеченный из ColumnTransformer), поэтому на пути
+    инференса не создается DataFrame.
+    """
+
+    def __init__(self, features: Any, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray,
+                 version: Union[str, None] = None):
+        if coef.ndim != 2 or intercept.shape != (coef.shape[1],) or classes.shape != (coef.shape[1], 2):
+            raise ValueError("Inconsistent shapes of coef, intercept and classes")
+        self.features = features
+        self.coef = np.ascontiguousarray(coef)
+        self.intercept = np.ascontiguousarray(intercept)
+        self.classes = np.ascontiguousarray(classes)
+        self.version = version
+
+    @property
+    def n_labels(self) -> int:
+        return self.coef.shape[1]
+
+    def decision_function(self, data: List[str]) -> np.ndarray:
+        features = self.features.transform(data)
+        return np.asarray(features @ self.coef) + self.intercept
+
+    def predict(self, data: List[str]) -> np.ndarray:
+        # как и LogisticRegression.predict, положительный класс выбирается при score > 0
+        return np.where(self.decision_function(data) > 0, self.classes[:, 1], self.classes[:, 0])
+
+
+def extract_features(preprocessor: "Pipeline") -> Any:
+    """Извлекает из препроцессора векторизатор, которому можно передавать список текстов напрямую.
+
+    Это возможно, если препроцессор - единственный ColumnTransformer без весов с одним трансформером,
+    которому передается одна колонка по имени, и без остальных колонок. В таком случае ColumnTransformer
+    лишь выбирает колонку и передает ее векторизатору, так что результат совпадает побитово.
+    Иначе возвращается адаптер FrameFeatures, который строит DataFrame как и раньше.
+    """
+    from sklearn.compose import ColumnTransformer
+
+    if len(preprocessor.steps) != 1 or not isinstance(preprocessor.steps[0][1], ColumnTransformer):
+        return FrameFeatures(preprocessor)
+    column_transformer = preprocessor.steps[0][1]
+    fitted = [
+        (name, transformer, columns) for name, transformer, columns in column_transformer.transformers_
+        if not (isinstance(transformer, str) and transformer == "drop") and not (hasattr(columns, "__len__") and len(columns) == 0)
+    ]
+    if len(fitted) != 1 or column_transformer.transformer_weights is not None:
+        return FrameFeatures(preprocessor)
+    _, vectorizer, column = fitted[0]
+    if not isinstance(column, str) or isinstance(vectorizer, str):
+        return FrameFeatures(preprocessor)
+    if not column_transformer.sparse_output_:
+        return DenseFeatures(vectorizer)
+    return vectorizer
+
+
+def compile_model(model: "Pipeline", version: Union[str, None] = None) -> LinearScorer:
+    """Собирает LinearScorer из обученного пайплайна с MultiOutputClassifier(LogisticRegression) на последнем шаге."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.multioutput import MultiOutputClassifier
+
+    classifier = model.steps[-1][1]
+    if not isinstance(classifier, MultiOutputClassifier):
+        raise TypeError(f"Expected MultiOutputClassifier as the last step, got {type(classifier).__name__}")
+    for estimator in classifier.estimators_:
+        if not isinstance(estimator, LogisticRegression) or len(estimator.classes_) != 2:
+            raise TypeError("Every estimator of MultiOutputClassifier must be a binary LogisticRegression")
+
+    coef = np.hstack([estimator.coef_.T for estimator in classifier.estimators_])
+    intercept = np.concatenate([estimator.intercept_ for estimator in classifier.estimators_])
+    classes = np.vstack([estimator.classes_ for estimator in classifier.estimators_])
+
+    return LinearScorer(extract_features(model[:-1]), coef, intercept, classes, version = version)
@@ -1,9 +1,10 @@
-from typing import Literal
+import os
+from typing import Literal, Union
 
-from pydantic import IPvAnyAddress
+from pydantic import Field, IPvAnyAddress
 from pydantic_settings import BaseSettings
 
-from core.definitions import BACKEND_PORT
+from core.definitions import BACKEND_PORT, MODEL_DIR
 
 
 class Settings(BaseSettings):
@@ -14,4 +15,66 @@ class Settings(BaseSettings):
     VERSION: Literal["dev", "prod"] = "dev"
     DEBUG: bool = False
     DEVELOPMENT: bool = False
-    LOGLEVEL: str = "WARNING"
\ No newline at end of file
+    LOGLEVEL: str = "WARNING"
+
+    # заголовок, из которого берется и в который возвращается correlation_id запроса (см. core.middleware)
+    CORRELATION_ID_HEADER: str = "X-Correlation-ID"
+
+    # токен для служебных ручек /admin (заголовок X-Admin-Token); если не задан, ручки недоступны
+    ADMIN_TOKEN: Union[str, None] = None
+    PROFILING_MAX_SECONDS: float = Field(default = 600.0, gt = 0)
+
+    # контроль допуска для /api/v1/predict_trends (см. core.admission): одновременно обслуживаемые запросы,
+    # длина очереди ожидания и время ожидания слота; сверх этого запрос сразу получает 429 или 503 с Retry-After
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_IN_FLIGHT: int = Field(default = 64, ge = 1)
+    ADMISSION_MAX_QUEUE: int = Field(default = 128, ge = 0)
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = Field(default = 1.0, gt = 0)
+    # заголовок с оставшимся у клиента временем на запрос в миллисекундах; запросы с истекшим дедлайном
+    # отклоняются до инференса
+    DEADLINE_HEADER: str = "X-Request-Timeout-Ms"
+
+    PREDICT_BATCH_MAX_SIZE: int = 10000
+    # потоковый NDJSON-скоринг: размер чанка, отправляемого в модель, и максимальная длина одной строки
+    STREAM_CHUNK_SIZE: int = Field(default = 256, ge = 1)
+    STREAM_MAX_LINE_BYTES: int = Field(default = 1 << 20, ge = 1)
+
+    MICRO_BATCHING_ENABLED: bool = False
+    MICRO_BATCH_MAX_SIZE: int = 64
+    MICRO_BATCH_MAX_WAIT_MS: float = 5.0
+
+    INFERENCE_BACKEND: Literal["inline", "thread", "process"] = "inline"
+    INFERENCE_WORKERS: int = os.cpu_count() or 1
+
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_ENTRIES: int = Field(default = 10000, ge = 1)
+    PREDICTION_CACHE_TTL_SECONDS: float = Field(default = 3600.0, gt = 0)
+    # объединение одновременных запросов predict_trends с одинаковым текстом в один инференс (см. core.cache.SingleFlight)
+    SINGLEFLIGHT_ENABLED: bool = True
+
+    # путь к pickle-файлу пайплайна или к директории версии артефакта (см. core.artifact)
+    MODEL_PATH: str = str(MODEL_DIR / "model.pkl")
+    MODEL_COMPILE: bool = True
+    MODEL_COMPACT_VOCABULARY: bool = True
+    # директория с версиями артефакта модели (см. core.registry): при старте используется самая новая версия,
+    # а появление новой версии подхватывается без перезапуска сервиса; если не задана, используется MODEL_PATH
+    MODEL_REGISTRY_DIR: Union[str, None] = None
+    MODEL_REGISTRY_POLL_SECONDS: float = Field(default = 10.0, gt = 0)
+
+    # прогрев версии модели перед обслуживанием запросов (см. core.warmup): корпус - текстовый файл с отзывом
+    # в каждой строке или синтетический корпус; версия прогрета, когда p95 задержки одиночного предсказания
+    # WARMUP_SETTLE_ROUNDS раундов подряд не превышает WARMUP_LATENCY_MS
+    WARMUP_CORPUS_PATH: Union[str, None] = None
+    WARMUP_LATENCY_MS: float = Field(default = 50.0, gt = 0)
+    WARMUP_SETTLE_ROUNDS: int = Field(default = 2, ge = 1)
+    WARMUP_MAX_SECONDS: float = Field(default = 30.0, gt = 0)
+    # readiness сообщает о перегрузке, когда заняты все слоты контроля допуска, а очередь ожидания заполнена
+    # на READINESS_ADMISSION_QUEUE_RATIO, или когда число запросов на процесс, включая пакетные и потоковые,
+    # которые контроль допуска не ограничивает, достигло READINESS_MAX_IN_FLIGHT
+    READINESS_ADMISSION_QUEUE_RATIO: float = Field(default = 0.5, ge = 0, le = 1)
+    READINESS_MAX_IN_FLIGHT: int = Field(default = 256, ge = 1)
+
+    # число процессов сервера; при WORKERS > 1 используется режим pre-fork (см. main.run_workers)
+    # при INFERENCE_BACKEND = "process" пулы воркеров создаются через fork и используют ту же копию модели
+    WORKERS: int = Field(default = 1, ge = 1)
+    WORKER_RESTART_DELAY: float = Field(default = 1.0, ge = 0)
@@ -0,0 +1,216 @@
+import re
+from typing import Iterator, List, Mapping, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from core.vocabulary import CHAR_BITS, MAX_KEY_CHARS, CompactVocabulary
+
+
+_white_spaces = re.compile(r"\s\s+")
+
+
+def char_wb_ngrams(text: str, ngram_range: Tuple[int, int]) -> Iterator[str]:
+    """Символьные n-граммы внутри границ слов, как analyzer="char_wb" в sklearn."""
+    min_n, max_n = ngram_range
+    for word in _white_spaces.sub(" ", text).split():
+        word = " " + word + " "
+        word_len = len(word)
+        for n in range(min_n, max_n + 1):
+            offset = 0
+            yield word[offset:offset + n]
+            while offset + n < word_len:
+                offset += 1
+                yield word[offset:offset + n]
+            if offset == 0:  # короткое слово (word_len < n) учитываем один раз
+                break
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int]) -> Iterator[str]:
+    """Символьные n-граммы по всему тексту, как analyzer="char" в sklearn."""
+    text = _white_spaces.sub(" ", text)
+    text_len = len(text)
+    min_n, max_n = ngram_range
+    if min_n == 1:
+        yield from text
+        min_n += 1
+    for n in range(min_n, min(max_n + 1, text_len + 1)):
+        for i in range(text_len - n + 1):
+            yield text[i:i + n]
+
+
+def ngram_keys(data: List[str], analyzer: str, ngram_range: Tuple[int, int], lowercase: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Векторизованный аналог char_wb_ngrams/char_ngrams для всего батча сразу.
+
+    Возвращает ключи n-грамм (см. core.vocabulary.ngram_key) и номер документа для каждого ключа.
+    Текст разбивается на сегменты - слова, окруженные пробелами, для char_wb или весь документ для char,
+    все сегменты склеиваются в один массив кодов символов, и n-граммы длины n - это окна, целиком
+    лежащие внутри одного сегмента. Ключи окон длины n получаются сдвигом ключей окон длины n - 1.
+    """
+    min_n, max_n = ngram_range
+    if max_n > MAX_KEY_CHARS:
+        raise ValueError(f"n-grams longer than {MAX_KEY_CHARS} characters can not be packed into keys")
+
+    segments: List[str] = []
+    segments_per_doc: List[int] = []
+    for text in data:
+        if lowercase:
+            text = text.lower()
+        if analyzer == "char_wb":
+            words = text.split()
+            segments.extend(words)
+            segments_per_doc.append(len(words))
+        else:
+            segments.append(_white_spaces.sub(" ", text))
+            segments_per_doc.append(1)
+
+    if analyzer == "char_wb":
+        joined = "".join([" " + word + " " for word in segments])
+        lengths = np.fromiter(map(len, segments), dtype = np.int64, count = len(segments)) + 2
+    else:
+        joined = "".join(segments)
+        lengths = np.fromiter(map(len, segments), dtype = np.int64, count = len(segments))
+
+    codes = np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype = np.uint32).astype(np.uint64) + 1
+    segment_ids = np.repeat(np.arange(len(segments), dtype = np.int64), lengths)
+    segment_docs = np.repeat(np.arange(len(data), dtype = np.int64), segments_per_doc)
+
+    keys: List[np.ndarray] = []
+    rows: List[np.ndarray] = []
+    window_keys = {}
+    for n in range(1, max_n + 1):
+        current = codes if n == 1 else (window_keys[n - 1][:-1] << np.uint64(CHAR_BITS)) | codes[n - 1:]
+        window_keys[n] = current
+        if n < min_n:
+            continue
+        starts = segment_ids[:len(current)]
+        inside = starts == segment_ids[n - 1:]
+        keys.append(current[inside])
+        rows.append(segment_docs[starts[inside]])
+
+    if analyzer == "char_wb" and min_n > 1:
+        # слово короче min_n (вместе с пробелами) учитывается один раз целиком, как в sklearn
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        for length in range(1, min_n):
+            short = np.flatnonzero(lengths == length)
+            keys.append(window_keys[length][offsets[short]])
+            rows.append(segment_docs[short])
+
+    if not keys:
+        return np.empty(0, dtype = np.uint64), np.empty(0, dtype = np.int64)
+    return np.concatenate(keys), np.concatenate(rows)
+
+
+ANALYZERS = {
+    "char_wb": char_wb_ngrams,
+    "char": char_ngrams,
+}
+
+
+class TfidfFeatures:
+    """TF-IDF признаки обученного TfidfVectorizer без зависимости от sklearn.
+
+    Повторяет TfidfVectorizer.transform для символьных анализаторов: подсчет n-грамм по словарю,
+    умножение на диагональ idf, sublinear_tf и l2/l1-нормировку строк. Порядок операций совпадает
+    с sklearn, поэтому значения признаков совпадают побитово.
+
+    Словарь может быть обычным dict или CompactVocabulary; во втором случае n-граммы всего батча
+    строятся и ищутся в словаре векторизованно (см. ngram_keys), а подсчет выполняется через np.unique.
+    """
+
+    def __init__(self, vocabulary: Mapping[str, int], idf: np.ndarray, analyzer: str = "char_wb",
+                 ngram_range: Tuple[int, int] = (1, 3), lowercase: bool = True, norm: str = "l2",
+                 sublinear_tf: bool = False):
+        if analyzer not in ANALYZERS:
+            raise ValueError(f"Unsupported analyzer: {analyzer}")
+        if norm not in ("l1", "l2", None):
+            raise ValueError(f"Unsupported norm: {norm}")
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.analyzer = analyzer
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+        self._ngrams = ANALYZERS[analyzer]
+        self._idf_diag = sp.diags(idf, offsets = 0, shape = (len(idf), len(idf)), format = "csr", dtype = np.float64)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.idf)
+
+    def count(self, data: List[str]) -> sp.csr_matrix:
+        if isinstance(self.vocabulary, CompactVocabulary):
+            return self._count_compact(data)
+        vocabulary = self.vocabulary
+        indices: List[int] = []
+        values: List[int] = []
+        indptr = [0]
+        for text in data:
+            if self.lowercase:
+                text = text.lower()
+            counter: dict = {}
+            for ngram in self._ngrams(text, self.ngram_range):
+                idx = vocabulary.get(ngram)
+                if idx is not None:
+                    counter[idx] = counter.get(idx, 0) + 1
+            indices.extend(counter.keys())
+            values.extend(counter.values())
+            indptr.append(len(indices))
+        counts = sp.csr_matrix(
+            (np.asarray(values, dtype = np.float64), np.asarray(indices, dtype = np.int32), np.asarray(indptr, dtype = np.int32)),
+            shape = (len(data), self.n_features),
+            dtype = np.float64
+        )
+        counts.sort_indices()
+        return counts
+
+    def _count_compact(self, data: List[str]) -> sp.csr_matrix:
+        keys, rows = ngram_keys(data, self.analyzer, self.ngram_range, self.lowercase)
+        indices = self.vocabulary.lookup_keys(keys)
+        found = indices >= 0
+        # ключ (строка, признак) упорядочен так же, как индексы CSR после sort_indices
+        cells, counts = np.unique(rows[found] * self.n_features + indices[found], return_counts = True)
+        indptr = np.searchsorted(cells, np.arange(len(data) + 1, dtype = np.int64) * self.n_features)
+        return sp.csr_matrix(
+            (counts.astype(np.float64), (cells % self.n_features).astype(np.int32), indptr.astype(np.int32)),
+            shape = (len(data), self.n_features),
+            dtype = np.float64
+        )
+
+    def transform(self, data: List[str]) -> sp.csr_matrix:
+        X = self.count(data)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        X = X @ self._idf_diag
+        if self.norm is not None:
+            # построчная сумма в порядке хранения элементов, как в sklearn.utils.sparsefuncs_fast
+            rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+            weights = X.data * X.data if self.norm == "l2" else np.abs(X.data)
+            norms = np.bincount(rows, weights = weights, minlength = X.shape[0])
+            if self.norm == "l2":
+                norms = np.sqrt(norms)
+            norms[norms == 0.0] = 1.0
+            X.data /= norms[rows]
+        return X
+
+
+def features_from_vectorizer(vectorizer: object, compact_vocabulary: bool = True) -> TfidfFeatures:
+    """Переносит параметры обученного TfidfVectorizer в TfidfFeatures, чтобы освободить исходный dict словаря."""
+    if getattr(vectorizer, "analyzer", None) not in ANALYZERS or getattr(vectorizer, "preprocessor", None) is not None \
+            or getattr(vectorizer, "strip_accents", None) is not None or getattr(vectorizer, "binary", True) \
+            or not getattr(vectorizer, "use_idf", False) or np.dtype(getattr(vectorizer, "dtype", np.float64)) != np.float64:
+        raise ValueError("Only float64 char and char_wb TfidfVectorizer with default preprocessing and idf are supported")
+    vocabulary = vectorizer.vocabulary_
+    if compact_vocabulary and max(vectorizer.ngram_range) <= MAX_KEY_CHARS:
+        vocabulary = CompactVocabulary.from_dict(vocabulary)
+    return TfidfFeatures(
+        vocabulary,
+        np.ascontiguousarray(vectorizer.idf_, dtype = np.float64),
+        analyzer = vectorizer.analyzer,
+        ngram_range = vectorizer.ngram_range,
+        lowercase = vectorizer.lowercase,
+        norm = vectorizer.norm,
+        sublinear_tf = vectorizer.sublinear_tf
+    )
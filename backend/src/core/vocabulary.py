@@ -0,0 +1,92 @@
+from typing import Iterator, List, Mapping, Union
+
+import numpy as np
+
+
+CHAR_BITS = 21  # достаточно для любого кода Unicode (до 0x10FFFF) со сдвигом на единицу
+MAX_KEY_CHARS = 64 // CHAR_BITS
+
+
+def ngram_key(ngram: str) -> int:
+    """Упаковывает n-грамму длиной до MAX_KEY_CHARS символов в одно 64-битное целое.
+
+    Каждый символ занимает CHAR_BITS бит и хранится как ord(c) + 1, поэтому ключ 0 не соответствует
+    ни одной n-грамме, а n-граммы разной длины не пересекаются.
+    """
+    key = 0
+    for char in ngram:
+        key = (key << CHAR_BITS) | (ord(char) + 1)
+    return key
+
+
+def key_ngram(key: int) -> str:
+    chars = []
+    while key:
+        chars.append(chr((key & ((1 << CHAR_BITS) - 1)) - 1))
+        key >>= CHAR_BITS
+    return "".join(reversed(chars))
+
+
+class CompactVocabulary(Mapping):
+    """Компактный словарь TF-IDF на двух массивах numpy вместо dict со строковыми ключами.
+
+    keys - отсортированные 64-битные ключи n-грамм (см. ngram_key), feature_index - индексы признаков
+    для каждого ключа. Поиск выполняется бинарным поиском (np.searchsorted) сразу по всем n-граммам
+    батча, поэтому словарь из ~10 тыс. n-грамм занимает ~110 КБ вместо ~1 МБ на процесс, а массивы
+    можно отображать в память из артефакта модели и делить между процессами.
+
+    Поддерживаются n-граммы длиной до MAX_KEY_CHARS символов; для словарей с более длинными
+    терминами from_dict выбрасывает ValueError и следует использовать обычный dict.
+    """
+
+    def __init__(self, keys: np.ndarray, feature_index: np.ndarray):
+        if keys.dtype != np.uint64 or keys.shape != feature_index.shape:
+            raise ValueError("keys must be an uint64 array of the same shape as feature_index")
+        self.keys = keys
+        self.feature_index = feature_index
+
+    @classmethod
+    def from_dict(cls, vocabulary: Mapping[str, int]) -> "CompactVocabulary":
+        if any(len(term) > MAX_KEY_CHARS or len(term) == 0 for term in vocabulary):
+            raise ValueError(f"Only vocabularies of 1 to {MAX_KEY_CHARS} character terms can be packed")
+        keys = np.fromiter((ngram_key(term) for term in vocabulary.keys()), dtype = np.uint64, count = len(vocabulary))
+        feature_index = np.fromiter(vocabulary.values(), dtype = np.int32, count = len(vocabulary))
+        order = np.argsort(keys, kind = "stable")
+        return cls(keys[order], feature_index[order])
+
+    def lookup_keys(self, keys: np.ndarray) -> np.ndarray:
+        """Возвращает индексы признаков для массива ключей n-грамм, -1 для отсутствующих в словаре."""
+        if len(self.keys) == 0:
+            return np.full(len(keys), -1, dtype = np.int64)
+        positions = np.searchsorted(self.keys, keys)
+        np.minimum(positions, len(self.keys) - 1, out = positions)
+        return np.where(self.keys[positions] == keys, self.feature_index[positions], -1).astype(np.int64, copy = False)
+
+    def lookup(self, ngrams: List[str]) -> np.ndarray:
+        keys = np.fromiter(
+            (ngram_key(ngram) if len(ngram) <= MAX_KEY_CHARS else 0 for ngram in ngrams), dtype = np.uint64, count = len(ngrams)
+        )
+        return self.lookup_keys(keys)
+
+    def get(self, term: str, default: Union[int, None] = None) -> Union[int, None]:
+        idx = int(self.lookup([term])[0])
+        return idx if idx >= 0 else default
+
+    def __getitem__(self, term: str) -> int:
+        idx = self.get(term)
+        if idx is None:
+            raise KeyError(term)
+        return idx
+
+    def __contains__(self, term: object) -> bool:
+        return isinstance(term, str) and self.get(term) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (key_ngram(key) for key in self.keys.tolist())
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.feature_index.nbytes
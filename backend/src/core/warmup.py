@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import List, Union
+
+from core.data import explain_predictions, preprocess, render_trends_lists, render_trends_response
+from core.logger import JSONLogger
+from core.registry import Deployment
+
+logger = JSONLogger(__name__)
+
+# размер порции корпуса при прогреве пакетного скоринга
+WARMUP_BATCH_SIZE = 16
+
+# фрагменты синтетических отзывов, из которых собирается корпус прогрева по умолчанию
+SYNTHETIC_PHRASES = [
+    "Приложение работает быстро и удобно",
+    "после обновления не могу войти в личный кабинет",
+    "деньги списали дважды, поддержка не отвечает",
+    "спасибо за сервис!",
+    "курьер опоздал на два часа, заказ пришел не полностью",
+    "очень много рекламы, интерфейс тормозит",
+    "The app keeps crashing on startup",
+    "оплата картой не проходит, ошибка 500",
+]
+
+
+def synthetic_corpus() -> List[str]:
+    """Тексты разной длины, от одного слова до длинного отзыва: прогреваются все ветви токенизации и скоринга."""
+    corpus = [phrase.split()[0] for phrase in SYNTHETIC_PHRASES]
+    corpus += SYNTHETIC_PHRASES
+    corpus += [". ".join(SYNTHETIC_PHRASES[:count]) for count in range(2, len(SYNTHETIC_PHRASES) + 1)]
+    corpus.append(" ".join(SYNTHETIC_PHRASES) * 8)
+    return corpus
+
+
+def load_corpus(path: Union[str, None] = None) -> List[str]:
+    """Корпус прогрева: непустые строки текстового файла path или синтетический корпус, если path не задан."""
+    if path is None:
+        return synthetic_corpus()
+    with open(path, "r", encoding = "utf-8") as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    if len(corpus) == 0:
+        raise ValueError(f"Warm-up corpus {path} is empty")
+    return corpus
+
+
+class WarmUp:
+    """Прогрев версии модели перед тем, как она начнет обслуживать запросы.
+
+    Корпус прогоняется раундами через тот же путь, что и запросы: preprocess, micro-batching или исполнитель
+    инференса, сборка ответа, а также пакетный скоринг. Версия считается прогретой, когда p95 задержки
+    одиночного предсказания settle_rounds раундов подряд не превышает latency_threshold_ms.
+    Процессы пула инференса дополнительно прогреваются тем же корпусом при запуске (см. core.executor).
+
+    Между текстами корпуса и порциями пакетного скоринга прогрев отдает управление циклу событий:
+    с исполнителем inline инференс не отпускает цикл, и без этого прогрев новой версии при горячей замене
+    останавливал бы обслуживание запросов и проверок здоровья на все время прогрева.
+    """
+
+    def __init__(self, corpus: List[str], latency_threshold_ms: float, settle_rounds: int = 2, max_seconds: float = 30.0):
+        if len(corpus) == 0:
+            raise ValueError("corpus must not be empty")
+        if settle_rounds < 1:
+            raise ValueError("settle_rounds must be positive")
+        self.corpus = corpus
+        self.latency_threshold = latency_threshold_ms / 1000
+        self.settle_rounds = settle_rounds
+        self.max_seconds = max_seconds
+
+    async def run_round(self, deployment: Deployment) -> List[float]:
+        latencies = []
+        for text in self.corpus:
+            started_at = time.perf_counter()
+            data = preprocess(text)
+            if deployment.batcher is not None:
+                prediction = await deployment.batcher.submit(data)
+            else:
+                prediction = await deployment.executor.predict([data])
+            render_trends_response(deployment.trend_fragments, prediction)
+            latencies.append(time.perf_counter() - started_at)
+            await asyncio.sleep(0)
+
+        for start in range(0, len(self.corpus), WARMUP_BATCH_SIZE):
+            prediction = await deployment.executor.predict([preprocess(text) for text in self.corpus[start:start + WARMUP_BATCH_SIZE]])
+            explain_predictions(deployment.mapping, prediction)
+            render_trends_lists(deployment.trend_fragments, prediction)
+            await asyncio.sleep(0)
+        return latencies
+
+    async def step(self, deployment: Deployment) -> bool:
+        """Один раунд прогрева с обновлением deployment.warmup; возвращает deployment.warmed."""
+        latencies = sorted(await self.run_round(deployment))
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        stable_rounds = deployment.warmup.get("stable_rounds", 0) + 1 if p95 <= self.latency_threshold else 0
+        deployment.warmup = {
+            "rounds": deployment.warmup["rounds"] + 1,
+            "p95_ms": round(p95 * 1000, 3),
+            "stable_rounds": stable_rounds,
+            "settled": stable_rounds >= self.settle_rounds,
+        }
+        return deployment.warmed
+
+    async def run(self, deployment: Deployment) -> bool:
+        """Прогревает версию до стабилизации задержки, но не дольше max_seconds; возвращает deployment.warmed."""
+        deadline = time.monotonic() + self.max_seconds
+        while not await self.step(deployment) and time.monotonic() < deadline:
+            pass
+        if not deployment.warmed:
+            logger.warning(
+                "Model version %s latency has not settled during warm-up: p95 %s ms", deployment.version, deployment.warmup["p95_ms"],
+                extra = {"model_version": deployment.version}
+            )
+        return deployment.warmed
+
+    async def settle(self, deployment: Deployment, interval: float = 1.0) -> None:
+        """Продолжает прогрев в фоне по раунду в interval секунд, пока задержка не стабилизируется или версия не будет заменена."""
+        while not deployment.warmed and not deployment.retired:
+            await asyncio.sleep(interval)
+            await self.step(deployment)
+        if deployment.warmed:
+            logger.info("Model version %s is warmed up", deployment.version, extra = {"model_version": deployment.version})
+        return None
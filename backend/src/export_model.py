@@ -0,0 +1,28 @@
+import argparse
+import pathlib
+import pickle
+
+from core.artifact import export_artifact, file_version
+from core.data import load_mapping
+from core.definitions import DATA_DIR, MODEL_DIR
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Exports the pickled pipeline into a memory-mappable model artifact")
+    parser.add_argument("--model", type = pathlib.Path, default = MODEL_DIR / "model.pkl", help = "pickled sklearn pipeline")
+    parser.add_argument("--mapping", type = pathlib.Path, default = DATA_DIR / "mapping_backend.json", help = "labels description")
+    parser.add_argument("--output", type = pathlib.Path, default = MODEL_DIR / "artifacts", help = "root directory of model versions")
+    parser.add_argument("--version", type = str, default = None, help = "version name, sha256 of the model file by default")
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        model = pickle.load(f)
+    version = args.version or file_version(args.model)
+    target = export_artifact(model, args.output, version, mapping = load_mapping(args.mapping))
+
+    print(f"Model version {version} exported to {target}")
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import hmac
+import pathlib
+from typing import Literal, Union
+
+from fastapi import Header, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from core.logger import JSONLogger
+from core.registry import list_versions
+from core.settings import Settings
+
+logger = JSONLogger(__name__)
+settings = Settings()
+
+ProfileSort = Literal["cumulative", "tottime", "calls", "ncalls", "time"]
+
+
+async def require_admin(x_admin_token: str = Header(default = "")) -> None:
+    """Пропускает запрос только с токеном ADMIN_TOKEN; без настроенного токена служебные ручки не существуют."""
+    if settings.ADMIN_TOKEN is None:
+        raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "Not Found")
+    if not hmac.compare_digest(x_admin_token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code = status.HTTP_403_FORBIDDEN, detail = "Forbidden")
+    return None
+
+
+async def start_profiling(
+    request: Request,
+    sample_every: int = Query(default = 100, ge = 1),
+    duration_seconds: float = Query(default = 60.0, gt = 0),
+) -> JSONResponse:
+    """Включает профилирование каждого sample_every-го запроса predict_trends на duration_seconds секунд."""
+    if duration_seconds > settings.PROFILING_MAX_SECONDS:
+        raise HTTPException(
+            status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail = f"duration_seconds must not exceed {settings.PROFILING_MAX_SECONDS}"
+        )
+    profiler = request.app.state.profiler
+    profiler.start(sample_every, duration_seconds)
+    logger.warning("Profiling of 1 in %s requests is enabled for %s seconds", sample_every, duration_seconds)
+    return JSONResponse(jsonable_encoder(profiler.status()), status_code = status.HTTP_200_OK)
+
+
+async def stop_profiling(request: Request) -> JSONResponse:
+    profiler = request.app.state.profiler
+    profiler.stop()
+    return JSONResponse(jsonable_encoder(profiler.status()), status_code = status.HTTP_200_OK)
+
+
+async def profiling_report(
+    request: Request,
+    sort: ProfileSort = "cumulative",
+    limit: int = Query(default = 50, ge = 1, le = 1000),
+) -> Response:
+    """Отчет pstats по запросам, попавшим в выборку с последнего включения профилирования."""
+    report = request.app.state.profiler.report(sort = sort, limit = limit)
+    return Response(report, status_code = status.HTTP_200_OK, media_type = "text/plain")
+
+
+async def model_status(request: Request) -> JSONResponse:
+    return JSONResponse(jsonable_encoder(request.app.state.registry.stats()), status_code = status.HTTP_200_OK)
+
+
+async def deploy_model(request: Request, version: Union[str, None] = None) -> JSONResponse:
+    """Разворачивает версию version из MODEL_REGISTRY_DIR (по умолчанию самую новую) или перечитывает MODEL_PATH.
+
+    Ответ возвращается, когда новая версия загружена, прогрета и уже обслуживает запросы.
+    """
+    registry_dir = settings.MODEL_REGISTRY_DIR
+    if registry_dir is None:
+        if version is not None:
+            raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = "MODEL_REGISTRY_DIR is not configured")
+        path = pathlib.Path(settings.MODEL_PATH)
+    else:
+        versions = {item.name: item for item in list_versions(registry_dir)}
+        if version is None and len(versions) > 0:
+            version = list(versions)[-1]
+        if version not in versions:
+            raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = f"Model version {version} is not found")
+        path = versions[version]
+    try:
+        await request.app.state.registry.deploy(path)
+    except Exception as exc:
+        logger.exception("Model %s can not be deployed", path)
+        raise HTTPException(status_code = status.HTTP_409_CONFLICT, detail = f"Model can not be deployed: {exc}") from exc
+    return JSONResponse(jsonable_encoder(request.app.state.registry.stats()), status_code = status.HTTP_200_OK)
@@ -1,12 +1,61 @@
-from fastapi import Request, status
+from fastapi import Request, Response, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 
+from core import metrics
+from core.settings import Settings
+
+settings = Settings()
+
 
 async def liveness_probe(_: Request) -> JSONResponse:
     return JSONResponse(jsonable_encoder({"alive": True}), status_code = status.HTTP_200_OK)
 
 
-async def readiness_probe(_: Request) -> JSONResponse:
-    # TODO: check connections readiness
-    return JSONResponse(jsonable_encoder({"ready": True}), status_code = status.HTTP_200_OK)
+async def readiness_probe(request: Request) -> JSONResponse:
+    """Готов, если модель загружена и прогрета (см. core.warmup) и процесс не перегружен: очередь контроля допуска
+    (см. core.admission) не заполнена на READINESS_ADMISSION_QUEUE_RATIO, а число запросов в обработке не достигло
+    READINESS_MAX_IN_FLIGHT. При перегрузке балансировщик перестает направлять в процесс новые запросы."""
+    registry = getattr(request.app.state, "registry", None)
+    admission = getattr(request.app.state, "admission", None)
+    stats = registry.stats() if registry is not None else {"version": None, "warmup": None}
+    in_flight = registry.in_flight if registry is not None else 0
+    queue_depth = admission.queue_depth if admission is not None else 0
+    checks = {
+        "model_loaded": stats["version"] is not None,
+        "warmed_up": stats["warmup"] is not None and bool(stats["warmup"]["settled"]),
+        "not_saturated": (
+            in_flight < settings.READINESS_MAX_IN_FLIGHT
+            and not (admission is not None and admission.saturated(settings.READINESS_ADMISSION_QUEUE_RATIO))
+        ),
+    }
+    ready = all(checks.values())
+    content = {
+        "ready": ready, "checks": checks, "model_version": stats["version"], "warmup": stats["warmup"],
+        "in_flight": in_flight, "admission_queue_depth": queue_depth
+    }
+    return JSONResponse(
+        jsonable_encoder(content),
+        status_code = status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+
+async def service_stats(request: Request) -> JSONResponse:
+    batcher = request.app.state.batcher
+    executor = request.app.state.executor
+    cache = request.app.state.cache
+    admission = request.app.state.admission
+    singleflight = request.app.state.singleflight
+    stats = {
+        "model": request.app.state.registry.stats(),
+        "executor": {"backend": executor.backend, "workers": executor.workers},
+        "batching": {"enabled": batcher is not None, **(batcher.stats() if batcher is not None else {})},
+        "cache": {"enabled": cache is not None, **(cache.stats() if cache is not None else {})},
+        "singleflight": {"enabled": singleflight is not None, **(singleflight.stats() if singleflight is not None else {})},
+        "admission": {"enabled": admission is not None, **(admission.stats() if admission is not None else {})},
+    }
+    return JSONResponse(jsonable_encoder(stats), status_code = status.HTTP_200_OK)
+
+
+async def service_metrics(_: Request) -> Response:
+    return Response(metrics.render_metrics(), status_code = status.HTTP_200_OK, media_type = metrics.CONTENT_TYPE)
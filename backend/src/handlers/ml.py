@@ -1,23 +1,379 @@
-from typing import Dict
+import contextlib
+import functools
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple, Union
 
-from fastapi import Request
-from sklearn.pipeline import Pipeline
+import numpy as np
+from fastapi import HTTPException, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
+from starlette.types import Receive, Scope, Send
 
-from core.data import preprocess, predict, explain_prediction
+from core import codecs, metrics
+from core.cache import PredictionCache, text_key
+from core.data import preprocess, explain_predictions, prediction_indices, render_trends_lists, render_trends_response
 from core.logger import JSONLogger
-from schemas.predict_trends import PredictTrendsRequest, PredictTrendsResponse
+from core.registry import Deployment
+from core.settings import Settings
+from schemas.predict_trends import (
+    PredictTrendsRequest,
+    PredictTrendsBatchRequest,
+    PredictTrendsBatchItem,
+    PredictTrendsBatchResponse
+)
 
 
 logger = JSONLogger(__name__)
+settings = Settings()
 
-async def predict_trends(request: Request, body: PredictTrendsRequest) -> PredictTrendsResponse:
-    model: Pipeline = request.app.state.model
-    mapping: Dict = request.app.state.mapping
+# заголовок ответа с версией модели, которая обслужила запрос
+MODEL_VERSION_HEADER = "X-Model-Version"
 
-    logger.info(f"A request has been received with body: {body.data}")
+def deployment_cache(request: Request, deployment: Deployment) -> Union[PredictionCache, None]:
+    # кеш хранит предсказания одной версии модели, поэтому запросы, которые дообслуживает
+    # замененная версия (см. core.registry), не должны сбрасывать его своей версией
+    return request.app.state.cache if not deployment.retired else None
 
-    data = preprocess(body.data)
-    prediction = predict(data, model)
-    prediction_explains = explain_prediction(mapping, prediction)
+async def predict_one(request: Request, deployment: Deployment, data: str) -> np.ndarray:
+    cache = deployment_cache(request, deployment)
+    version = deployment.version
+    if cache is not None:
+        prediction = cache.get(data, version)
+        if prediction is not None:
+            return prediction
+
+    if deployment.batcher is not None:
+        prediction = await deployment.batcher.submit(data)
+    else:
+        prediction = await deployment.executor.predict([data])
+
+    if cache is not None:
+        cache.put(data, version, prediction)
+    return prediction
+
+async def predict_many(request: Request, deployment: Deployment, data: List[str]) -> np.ndarray:
+    cache = deployment_cache(request, deployment)
+    if cache is None:
+        return await deployment.executor.predict(data)
+
+    version = deployment.version
+    rows: List[Union[np.ndarray, None]] = [cache.get(item, version) for item in data]
+    missed = [idx for idx, row in enumerate(rows) if row is None]
+    if len(missed) > 0:
+        prediction = await deployment.executor.predict([data[idx] for idx in missed])
+        for position, idx in enumerate(missed):
+            rows[idx] = prediction[position:position + 1]
+            cache.put(data[idx], version, rows[idx])
+    return np.vstack(rows)
+
+async def predict_trends(request: Request, body: PredictTrendsRequest) -> Response:
+    profiler = request.app.state.profiler
+    if profiler.active:
+        # включено профилирование по требованию (см. handlers.admin)
+        return await profiler.run(handle_predict_trends(request, body))
+    return await handle_predict_trends(request, body)
+
+async def handle_predict_trends(request: Request, body: PredictTrendsRequest) -> Response:
+    media_type = codecs.response_media_type(request.headers.get("accept"))
+    # весь запрос обслуживает одна версия модели, даже если во время него произойдет замена (см. core.registry)
+    with request.app.state.registry.acquire() as deployment:
+        logger.info(f"A request has been received with body: {body.data}", extra = {"model_version": deployment.version})
+
+        started_at = time.perf_counter()
+        data = preprocess(body.data)
+        metrics.preprocess_seconds.observe(time.perf_counter() - started_at)
+        singleflight = request.app.state.singleflight
+        if singleflight is not None:
+            # одинаковые тексты, пришедшие одновременно, получают один и тот же ответ одного инференса
+            key = (deployment.version, text_key(data), media_type)
+            content = await singleflight.do(key, functools.partial(score_one, request, deployment, data, media_type))
+        else:
+            content = await score_one(request, deployment, data, media_type)
+
+    return Response(content, media_type = media_type, headers = {MODEL_VERSION_HEADER: deployment.version})
+
+async def score_one(request: Request, deployment: Deployment, data: str, media_type: str = codecs.JSON_MEDIA_TYPE) -> bytes:
+    started_at = time.perf_counter()
+    prediction = await predict_one(request, deployment, data)
+    predicted_at = time.perf_counter()
+    if media_type == codecs.MSGPACK_MEDIA_TYPE:
+        content = codecs.encode_msgpack({"labels": prediction_indices(prediction)[0]})
+    else:
+        # тело PredictTrendsResponse собирается из заранее сериализованных фрагментов меток (см. core.data.serialize_mapping)
+        content = render_trends_response(deployment.trend_fragments, prediction)
+    metrics.predict_seconds.observe(predicted_at - started_at)
+    metrics.explain_seconds.observe(time.perf_counter() - predicted_at)
+    return content
+
+async def read_payload(request: Request) -> Tuple[Any, str]:
+    """Разбирает тело запроса в формате из Content-Type (см. core.codecs); возвращает данные и формат."""
+    try:
+        media_type = codecs.request_media_type(request.headers.get("content-type"))
+    except codecs.UnsupportedMediaType as exc:
+        raise HTTPException(status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail = str(exc)) from exc
+    try:
+        return codecs.decode(await request.body(), media_type), media_type
+    except ValueError as exc:
+        raise RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": str(exc), "input": None}]) from exc
+
+def validation_error(exc: ValidationError, payload: Any, media_type: str) -> RequestValidationError:
+    # те же ошибки, что вернул бы FastAPI при валидации тела запроса моделью; тело и значения из msgpack
+    # (в том числе bytes) в ответ не попадают, так как ответ с ошибкой сериализуется в JSON
+    is_json = media_type == codecs.JSON_MEDIA_TYPE
+    errors = [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_input = is_json)]
+    return RequestValidationError(errors, body = payload if is_json else None)
+
+async def predict_trends_post(request: Request) -> Response:
+    """POST-вариант predict_trends: тело в JSON или msgpack по Content-Type, ответ в формате из Accept."""
+    started_at = time.perf_counter()
+    payload, media_type = await read_payload(request)
+    try:
+        body = PredictTrendsRequest.model_validate(payload, from_attributes = True)
+    except ValidationError as exc:
+        raise validation_error(exc, payload, media_type) from None
+    metrics.observe_validation(time.perf_counter() - started_at)
+    return await predict_trends(request, body)
+
+async def predict_trends_labels(request: Request) -> Response:
+    """Описание меток текущей версии модели: по нему клиент расшифровывает индексы меток из ответов в msgpack."""
+    media_type = codecs.response_media_type(request.headers.get("accept"))
+    deployment = request.app.state.registry.current
+    labels = {int(idx): [value.strip() for value in trend] for idx, trend in deployment.mapping.items()}
+    if media_type == codecs.MSGPACK_MEDIA_TYPE:
+        content = codecs.encode_msgpack({"labels": labels})
+    else:
+        content = json.dumps({"labels": labels}, ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+    return Response(content, media_type = media_type, headers = {MODEL_VERSION_HEADER: deployment.version})
+
+async def check_batch_size(request: Request) -> None:
+    """Отклоняет слишком большой пакет до валидации тела запроса, по уже разобранному JSON."""
+    if not await request.body():
+        return None
+    try:
+        body = await request.json()
+    except ValueError:
+        # некорректный JSON отклонит валидация тела запроса
+        return None
+    data = body.get("data") if isinstance(body, dict) else None
+    if isinstance(data, list) and len(data) > settings.PREDICT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail = f"Batch size must not exceed {settings.PREDICT_BATCH_MAX_SIZE} items"
+        )
+    return None
+
+async def predict_trends_batch(request: Request, response: Response, body: PredictTrendsBatchRequest) -> PredictTrendsBatchResponse:
+    with request.app.state.registry.acquire() as deployment:
+        response.headers[MODEL_VERSION_HEADER] = deployment.version
+        return await score_batch(request, deployment, body)
+
+async def score_batch(request: Request, deployment: Deployment, body: PredictTrendsBatchRequest) -> PredictTrendsBatchResponse:
+    mapping: Dict = deployment.mapping
+
+    logger.info(f"A batch request has been received with {len(body.data)} items", extra = {"model_version": deployment.version})
+
+    results: List[Union[PredictTrendsBatchItem, None]] = []
+    valid_positions: List[int] = []
+    valid_data: List[str] = []
+    validation_time = preprocess_time = 0.0
+    for item in body.data:
+        started_at = time.perf_counter()
+        try:
+            item_model = PredictTrendsRequest.model_validate({"data": item})
+        except ValidationError as exc:
+            results.append(PredictTrendsBatchItem(detail = exc.errors(include_url = False, include_input = False)))
+            validation_time += time.perf_counter() - started_at
+            continue
+        validated_at = time.perf_counter()
+        valid_positions.append(len(results))
+        valid_data.append(preprocess(item_model.data))
+        results.append(None)
+        validation_time += validated_at - started_at
+        preprocess_time += time.perf_counter() - validated_at
+    metrics.observe_validation(validation_time)
+    metrics.preprocess_seconds.observe(preprocess_time)
+
+    if len(valid_data) > 0:
+        started_at = time.perf_counter()
+        prediction = await predict_many(request, deployment, valid_data)
+        predicted_at = time.perf_counter()
+        for position, prediction_explains in zip(valid_positions, explain_predictions(mapping, prediction)):
+            results[position] = PredictTrendsBatchItem(trends_list = prediction_explains)
+        metrics.predict_seconds.observe(predicted_at - started_at)
+        metrics.explain_seconds.observe(time.perf_counter() - predicted_at)
+
+    return PredictTrendsBatchResponse(results = results)
+
+
+async def predict_trends_batch_post(request: Request) -> Response:
+    """POST-вариант пакетного скоринга: тело в JSON или msgpack по Content-Type, ответ в формате из Accept.
+
+    Тело разбирается прямо из байтов запроса, без модели PredictTrendsBatchRequest: строки проверяются
+    так же, как в PredictTrendsRequest (непустые после обрезки пробелов), а pydantic вызывается только
+    для элементов, не прошедших быструю проверку, чтобы описать ошибку. Ответ в JSON совпадает
+    с PredictTrendsBatchResponse, в msgpack содержит индексы меток и ошибки по номерам элементов.
+    """
+    media_type = codecs.response_media_type(request.headers.get("accept"))
+    started_at = time.perf_counter()
+    payload, request_media_type = await read_payload(request)
+    data = payload.get("data") if isinstance(payload, dict) and len(payload) == 1 else None
+    if not isinstance(data, list) or len(data) == 0:
+        # ошибки в структуре тела описывает pydantic
+        try:
+            PredictTrendsBatchRequest.model_validate(payload, from_attributes = True)
+        except ValidationError as exc:
+            raise validation_error(exc, payload, request_media_type) from None
+    if len(data) > settings.PREDICT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail = f"Batch size must not exceed {settings.PREDICT_BATCH_MAX_SIZE} items"
+        )
+
+    valid_positions: List[int] = []
+    valid_data: List[str] = []
+    errors: Dict[int, List[Dict[str, Any]]] = {}
+    for position, item in enumerate(data):
+        text = item.strip() if isinstance(item, str) else ""
+        if not text:
+            try:
+                text = PredictTrendsRequest.model_validate({"data": item}).data
+            except ValidationError as exc:
+                errors[position] = exc.errors(include_url = False, include_input = False)
+                continue
+        valid_positions.append(position)
+        valid_data.append(preprocess(text))
+    metrics.observe_validation(time.perf_counter() - started_at)
+
+    with request.app.state.registry.acquire() as deployment:
+        logger.info(f"A batch request has been received with {len(data)} items", extra = {"model_version": deployment.version})
+        prediction = None
+        if len(valid_data) > 0:
+            predicted_at = time.perf_counter()
+            prediction = await predict_many(request, deployment, valid_data)
+            metrics.predict_seconds.observe(time.perf_counter() - predicted_at)
+
+        rendered_at = time.perf_counter()
+        if media_type == codecs.MSGPACK_MEDIA_TYPE:
+            labels: List[Union[List[int], None]] = [None] * len(data)
+            if prediction is not None:
+                for position, indices in zip(valid_positions, prediction_indices(prediction)):
+                    labels[position] = indices
+            content = codecs.encode_msgpack({"labels": labels, "errors": errors})
+        else:
+            results: List[bytes] = [b""] * len(data)
+            if prediction is not None:
+                for position, trends_list in zip(valid_positions, render_trends_lists(deployment.trend_fragments, prediction)):
+                    results[position] = b'{"trends_list":' + trends_list + b',"detail":null}'
+            for position, detail in errors.items():
+                results[position] = json.dumps({"trends_list": None, "detail": detail}, ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+            content = b'{"results":[' + b",".join(results) + b"]}"
+        metrics.explain_seconds.observe(time.perf_counter() - rendered_at)
+
+    return Response(content, media_type = media_type, headers = {MODEL_VERSION_HEADER: deployment.version})
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """StreamingResponse, который не слушает receive во время отправки ответа.
+
+    Обычный StreamingResponse параллельно ждет http.disconnect и тем самым забирает сообщения с телом
+    запроса, которое потоковый обработчик еще читает. Отключение клиента здесь обнаруживается
+    при чтении тела запроса (starlette.requests.ClientDisconnect).
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        finally:
+            # background освобождает версию модели (см. predict_trends_stream), в том числе при обрыве потока
+            if self.background is not None:
+                await self.background()
+
+async def iter_lines(request: Request) -> AsyncIterator[List[bytes]]:
+    """Читает тело запроса по мере поступления и отдает накопленные непустые строки порциями."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        if len(buffer) > settings.STREAM_MAX_LINE_BYTES:
+            raise ValueError(f"Line is longer than {settings.STREAM_MAX_LINE_BYTES} bytes")
+        lines = [line for line in lines if line.strip()]
+        if len(lines) > 0:
+            yield lines
+    if buffer.strip():
+        yield [buffer]
+
+async def score_lines(request: Request, deployment: Deployment, lines: List[bytes]) -> bytes:
+    results: List[bytes] = []
+    valid_positions: List[int] = []
+    valid_data: List[str] = []
+    validation_time = preprocess_time = 0.0
+    for line in lines:
+        started_at = time.perf_counter()
+        try:
+            item_model = PredictTrendsRequest.model_validate_json(line)
+        except ValidationError as exc:
+            detail = exc.errors(include_url = False, include_input = False)
+            results.append(json.dumps({"trends_list": None, "detail": detail}, ensure_ascii = False, separators = (",", ":")).encode("utf-8"))
+            validation_time += time.perf_counter() - started_at
+            continue
+        validated_at = time.perf_counter()
+        valid_positions.append(len(results))
+        valid_data.append(preprocess(item_model.data))
+        results.append(b"")
+        validation_time += validated_at - started_at
+        preprocess_time += time.perf_counter() - validated_at
+    # тело потокового ответа формируется после возврата из обработчика, поэтому стадии записываются по чанкам
+    metrics.observe_validation(validation_time)
+    metrics.preprocess_seconds.observe(preprocess_time)
+
+    if len(valid_data) > 0:
+        started_at = time.perf_counter()
+        prediction = await predict_many(request, deployment, valid_data)
+        predicted_at = time.perf_counter()
+        for position, trends_list in zip(valid_positions, render_trends_lists(deployment.trend_fragments, prediction)):
+            results[position] = b'{"trends_list":' + trends_list + b',"detail":null}'
+        metrics.predict_seconds.observe(predicted_at - started_at)
+        metrics.explain_seconds.observe(time.perf_counter() - predicted_at)
+
+    return b"\n".join(results) + b"\n"
+
+async def stream_predictions(request: Request, deployment: Deployment) -> AsyncIterator[bytes]:
+    chunk_size = settings.STREAM_CHUNK_SIZE
+    pending: List[bytes] = []
+    scored = 0
+    try:
+        async for lines in iter_lines(request):
+            pending.extend(lines)
+            while len(pending) >= chunk_size:
+                yield await score_lines(request, deployment, pending[:chunk_size])
+                scored += chunk_size
+                pending = pending[chunk_size:]
+        if len(pending) > 0:
+            yield await score_lines(request, deployment, pending)
+            scored += len(pending)
+    except ValueError as exc:
+        # статус ответа уже отправлен, поэтому ошибка передается последней строкой потока
+        yield json.dumps({"trends_list": None, "detail": str(exc)}, ensure_ascii = False).encode("utf-8") + b"\n"
+    logger.info(f"A streaming request has been scored with {scored} items", extra = {"model_version": deployment.version})
+
+async def predict_trends_stream(request: Request) -> NDJSONStreamingResponse:
+    """Скоринг NDJSON-потока: каждая строка запроса - PredictTrendsRequest, каждая строка ответа - PredictTrendsBatchItem.
+
+    Тело запроса читается по частям и отправляется в модель чанками по STREAM_CHUNK_SIZE строк,
+    результаты каждого чанка сразу отправляются клиенту, поэтому потребление памяти не зависит от размера входа.
+    """
+    # версия модели удерживается до конца отправки потока, а не до возврата из обработчика
+    lease = contextlib.ExitStack()
+    deployment = lease.enter_context(request.app.state.registry.acquire())
+    return NDJSONStreamingResponse(
+        stream_predictions(request, deployment),
+        headers = {MODEL_VERSION_HEADER: deployment.version},
+        background = BackgroundTask(lease.close)
+    )
 
-    return PredictTrendsResponse(trends_list = prediction_explains)
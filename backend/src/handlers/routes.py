@@ -1,9 +1,10 @@
-from fastapi import Response, status
+from fastapi import Depends, Response, status
 from fastapi.routing import APIRoute
 from starlette.routing import BaseRoute
 
-import handlers.health, handlers.ml
-from schemas.predict_trends import PredictTrendsResponse
+import handlers.admin, handlers.health, handlers.ml
+from core.metrics import InstrumentedAPIRoute
+from schemas.predict_trends import PredictTrendsResponse, PredictTrendsBatchResponse
 
 
 routes: list[BaseRoute] = [
@@ -34,10 +35,41 @@ routes: list[BaseRoute] = [
         include_in_schema=False,
         responses={
             200: {"description": "Success"},
+            503: {"description": "Model is not warmed up or the service is saturated"},
             500: {"description": "Internal server error"},
         },
     ),
     APIRoute(
+        "/monitoring/stats",
+        handlers.health.service_stats,
+        methods=["GET"],
+        tags=["Monitoring"],
+        summary="Service runtime statistics",
+        description="Queue depth and batch size statistics of the inference components",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        responses={
+            200: {"description": "Success"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    APIRoute(
+        "/monitoring/metrics",
+        handlers.health.service_metrics,
+        methods=["GET"],
+        tags=["Monitoring"],
+        summary="Service metrics",
+        description="Request counters and per-stage latency histograms in the Prometheus text format",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        responses={
+            200: {"description": "Success"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    InstrumentedAPIRoute(
         "/api/v1/predict_trends",
         handlers.ml.predict_trends,
         methods=["GET"],
@@ -49,6 +81,183 @@ routes: list[BaseRoute] = [
         include_in_schema=False,
         responses={
             200: {"description": "Success"},
+            400: {"description": "Malformed deadline header"},
+            429: {"description": "Admission queue is full"},
+            503: {"description": "No admission slot within the queue timeout"},
+            504: {"description": "Request deadline is exceeded"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    InstrumentedAPIRoute(
+        "/api/v1/predict_trends",
+        handlers.ml.predict_trends_post,
+        methods=["POST"],
+        tags=["ML"],
+        summary="Predicts trends in User reviews",
+        description="Predicts trends in a User review sent as JSON or msgpack; msgpack responses carry label indices",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        responses={
+            200: {"description": "Success"},
+            400: {"description": "Malformed deadline header"},
+            415: {"description": "Unsupported content type"},
+            422: {"description": "Validation error"},
+            429: {"description": "Admission queue is full"},
+            503: {"description": "No admission slot within the queue timeout"},
+            504: {"description": "Request deadline is exceeded"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    InstrumentedAPIRoute(
+        "/api/v1/predict_trends/labels",
+        handlers.ml.predict_trends_labels,
+        methods=["GET"],
+        tags=["ML"],
+        summary="Trend labels of the deployed model",
+        description="Descriptions of the label indices returned in msgpack responses",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        responses={
+            200: {"description": "Success"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    InstrumentedAPIRoute(
+        "/api/v1/predict_trends/batch",
+        handlers.ml.predict_trends_batch,
+        methods=["GET"],
+        tags=["ML"],
+        summary="Predicts trends in a batch of User reviews",
+        description="Predicts trends in a batch of User reviews with a single model call",
+        response_model=PredictTrendsBatchResponse,
+        dependencies=[Depends(handlers.ml.check_batch_size)],
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        responses={
+            200: {"description": "Success"},
+            413: {"description": "Batch is too large"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    InstrumentedAPIRoute(
+        "/api/v1/predict_trends/batch",
+        handlers.ml.predict_trends_batch_post,
+        methods=["POST"],
+        tags=["ML"],
+        summary="Predicts trends in a batch of User reviews",
+        description="Scores a batch sent as JSON or msgpack, parsed from the raw body; msgpack responses carry label indices",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        responses={
+            200: {"description": "Success"},
+            413: {"description": "Batch is too large"},
+            415: {"description": "Unsupported content type"},
+            422: {"description": "Validation error"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    InstrumentedAPIRoute(
+        "/api/v1/predict_trends/stream",
+        handlers.ml.predict_trends_stream,
+        methods=["POST"],
+        tags=["ML"],
+        summary="Predicts trends in a stream of User reviews",
+        description="Scores a newline-delimited JSON stream of reviews in chunks and streams NDJSON results back",
+        response_class=handlers.ml.NDJSONStreamingResponse,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        responses={
+            200: {"description": "Success"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    APIRoute(
+        "/admin/profiling",
+        handlers.admin.start_profiling,
+        methods=["POST"],
+        tags=["Admin"],
+        summary="Starts request profiling",
+        description="Profiles 1 in sample_every predict_trends requests for duration_seconds seconds",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        dependencies=[Depends(handlers.admin.require_admin)],
+        responses={
+            200: {"description": "Success"},
+            403: {"description": "Forbidden"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    APIRoute(
+        "/admin/profiling",
+        handlers.admin.stop_profiling,
+        methods=["DELETE"],
+        tags=["Admin"],
+        summary="Stops request profiling",
+        description="Stops request profiling and keeps the collected report",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        dependencies=[Depends(handlers.admin.require_admin)],
+        responses={
+            200: {"description": "Success"},
+            403: {"description": "Forbidden"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    APIRoute(
+        "/admin/profiling",
+        handlers.admin.profiling_report,
+        methods=["GET"],
+        tags=["Admin"],
+        summary="Request profiling report",
+        description="Aggregated pstats report of the sampled predict_trends requests",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        dependencies=[Depends(handlers.admin.require_admin)],
+        responses={
+            200: {"description": "Success"},
+            403: {"description": "Forbidden"},
+            500: {"description": "Internal server error"},
+        },
+        ),
+    APIRoute(
+        "/admin/model",
+        handlers.admin.model_status,
+        methods=["GET"],
+        tags=["Admin"],
+        summary="Deployed model version",
+        description="Active model version and versions that are still serving in-flight requests",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        dependencies=[Depends(handlers.admin.require_admin)],
+        responses={
+            200: {"description": "Success"},
+            403: {"description": "Forbidden"},
+            500: {"description": "Internal server error"},
+        },
+    ),
+    APIRoute(
+        "/admin/model",
+        handlers.admin.deploy_model,
+        methods=["POST"],
+        tags=["Admin"],
+        summary="Deploys a model version",
+        description="Loads and warms up a model version and swaps it in without dropping requests",
+        response_class=Response,
+        status_code=status.HTTP_200_OK,
+        include_in_schema=False,
+        dependencies=[Depends(handlers.admin.require_admin)],
+        responses={
+            200: {"description": "Success"},
+            403: {"description": "Forbidden"},
+            404: {"description": "Model version is not found"},
+            409: {"description": "Model version can not be deployed"},
             500: {"description": "Internal server error"},
         },
     )
@@ -1,9 +1,14 @@
 from contextlib import asynccontextmanager
+import asyncio
 import functools
-from typing import AsyncGenerator, Any, Union
+import gc
+import os
+import pathlib
+import signal
+import socket
+import time
+from typing import AsyncGenerator, Any, Dict, List, Union
 
-import json
-import pickle
 import uvicorn
 import uvloop
 from fastapi import APIRouter, FastAPI, Request, Response
@@ -11,14 +16,27 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 
 
-from core.definitions import DATA_DIR, MODEL_DIR
+from core.admission import AdmissionController, AdmissionRejected
+from core.artifact import MAPPING_FILE, file_version
+from core.batching import MicroBatcher
+from core.cache import PredictionCache, SingleFlight
+from core.data import load_model, load_mapping
+from core.definitions import DATA_DIR
+from core.executor import InferenceExecutor
+from core.middleware import AdmissionMiddleware, CorrelationIdMiddleware
+from core.profiling import RequestProfiler
+from core.registry import Deployment, ModelRegistry, list_versions
+from core.warmup import WarmUp, load_corpus
 from handlers.routes import routes
 from core.settings import Settings
-from core.logger import JSONLogger
+from core.logger import JSONLogger, stop_listener
 
 logger = JSONLogger(__name__)
 settings = Settings()
 
+# зависимости, загруженные в родительском процессе до fork в режиме нескольких воркеров (см. run_workers)
+preloaded_dependencies: Dict[str, Any] = {}
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, Any]:
     
@@ -28,6 +46,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, Any]:
     
     yield
     
+    await release_app_dependencies(app)
     logger.info("Shutdown is complete!")
 
 
@@ -57,10 +76,12 @@ def create_app()-> FastAPI:
         },
     )
     app.include_router(router=APIRouter(routes=routes))
+    app.add_middleware(AdmissionMiddleware, paths=["/api/v1/predict_trends"], header_name=settings.DEADLINE_HEADER)
+    app.add_middleware(CorrelationIdMiddleware, header_name=settings.CORRELATION_ID_HEADER)
     return app
 
 
-async def run_server(entrypoint: Union[str, FastAPI], port: int) -> None:
+async def run_server(entrypoint: Union[str, FastAPI], port: int, sockets: Union[List[socket.socket], None] = None) -> None:
     config = uvicorn.Config(
         entrypoint,
         host=str(settings.APP_HOST),
@@ -72,7 +93,7 @@ async def run_server(entrypoint: Union[str, FastAPI], port: int) -> None:
     logger.info("Server is running on %s:%s", settings.APP_HOST, port)
 
     try:
-        await srv.serve()
+        await srv.serve(sockets = sockets)
     except Exception as exc: 
         logger.exception(exc)
 
@@ -81,20 +102,234 @@ def event_shutdown()-> None:
     raise Exception("Error")
 
 
+def resolve_model_path() -> pathlib.Path:
+    """Самая новая версия из MODEL_REGISTRY_DIR, а если реестр не задан или пуст - MODEL_PATH."""
+    if settings.MODEL_REGISTRY_DIR is not None:
+        versions = list_versions(settings.MODEL_REGISTRY_DIR)
+        if len(versions) > 0:
+            return versions[-1]
+    return pathlib.Path(settings.MODEL_PATH)
+
+
+def load_model_dependencies(model_path: Union[pathlib.Path, None] = None) -> Dict[str, Any]:
+    model_path = model_path or resolve_model_path()
+    model_loader = functools.partial(
+        load_model, model_path, compile = settings.MODEL_COMPILE, compact_vocabulary = settings.MODEL_COMPACT_VOCABULARY
+    )
+    mapping_path = model_path / MAPPING_FILE
+    if not mapping_path.is_file():
+        mapping_path = DATA_DIR / 'mapping_backend.json'
+    model = model_loader()
+    return {
+        "model_path": model_path,
+        "model_loader": model_loader,
+        "model": model,
+        "version": getattr(model, "version", None) or file_version(model_path),
+        "mapping": load_mapping(mapping_path),
+    }
+
+
+async def build_deployment(warm_up: WarmUp, model_path: pathlib.Path) -> Deployment:
+    """Загружает версию модели вне цикла событий, запускает для нее исполнитель инференса и прогревает ее."""
+    if preloaded_dependencies.get("model_path") == model_path:
+        # первая версия воркера уже загружена родителем до fork
+        dependencies = preloaded_dependencies.copy()
+        preloaded_dependencies.clear()
+    else:
+        dependencies = await asyncio.to_thread(load_model_dependencies, model_path)
+
+    executor = InferenceExecutor(
+        settings.INFERENCE_BACKEND,
+        model = dependencies["model"],
+        loader = dependencies["model_loader"],
+        workers = settings.INFERENCE_WORKERS,
+        warmup = warm_up.corpus
+    )
+    batcher = None
+    if settings.MICRO_BATCHING_ENABLED:
+        batcher = MicroBatcher(
+            executor.predict,
+            max_batch_size = settings.MICRO_BATCH_MAX_SIZE,
+            max_wait_ms = settings.MICRO_BATCH_MAX_WAIT_MS,
+            max_concurrent_batches = executor.workers
+        )
+    deployment = Deployment(dependencies["version"], dependencies["model"], dependencies["mapping"], executor, batcher)
+    await deployment.start()
+    try:
+        await warm_up.run(deployment)
+    except BaseException:
+        await deployment.stop()
+        raise
+    return deployment
+
+
+def publish_deployment(app: FastAPI, deployment: Deployment) -> None:
+    app.state.model = deployment.model
+    app.state.mapping = deployment.mapping
+    app.state.trend_fragments = deployment.trend_fragments
+    app.state.executor = deployment.executor
+    app.state.batcher = deployment.batcher
+    return None
+
+
 async def register_app_dependencies(app: FastAPI) -> None:
     
     app.state.server_logger = logger
-    with open(MODEL_DIR / 'model.pkl', 'rb') as f:
-        app.state.model = pickle.load(f)
-    with open(DATA_DIR / 'mapping_backend.json', 'r') as f:
-        app.state.mapping = json.load(f)
+    app.state.profiler = RequestProfiler()
+
+    app.state.admission = None
+    if settings.ADMISSION_ENABLED:
+        app.state.admission = AdmissionController(
+            max_in_flight = settings.ADMISSION_MAX_IN_FLIGHT,
+            max_queue = settings.ADMISSION_MAX_QUEUE,
+            queue_timeout = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        )
+
+    app.state.cache = None
+    if settings.PREDICTION_CACHE_ENABLED:
+        # кэш общий для всех версий модели: версия входит в ключ записи
+        app.state.cache = PredictionCache(
+            max_entries = settings.PREDICTION_CACHE_MAX_ENTRIES,
+            ttl_seconds = settings.PREDICTION_CACHE_TTL_SECONDS
+        )
+
+    app.state.warm_up = WarmUp(
+        load_corpus(settings.WARMUP_CORPUS_PATH),
+        latency_threshold_ms = settings.WARMUP_LATENCY_MS,
+        settle_rounds = settings.WARMUP_SETTLE_ROUNDS,
+        max_seconds = settings.WARMUP_MAX_SECONDS
+    )
+    # истекший дедлайн ведущего запроса не должен доставаться ожидающим с тем же текстом
+    app.state.singleflight = SingleFlight(retry_on = (AdmissionRejected,)) if settings.SINGLEFLIGHT_ENABLED else None
+
+    app.state.registry = ModelRegistry(
+        functools.partial(build_deployment, app.state.warm_up), on_deploy = functools.partial(publish_deployment, app)
+    )
+    model_path = preloaded_dependencies.get("model_path") or await asyncio.to_thread(resolve_model_path)
+    deployment = await app.state.registry.deploy(model_path)
+
+    app.state.warmup_task = None
+    if not deployment.warmed:
+        # первую версию заменить нечем: сервис запускается, но readiness ждет окончания прогрева
+        app.state.warmup_task = asyncio.create_task(app.state.warm_up.settle(deployment))
+
+    app.state.registry_watcher = None
+    if settings.MODEL_REGISTRY_DIR is not None:
+        app.state.registry_watcher = asyncio.create_task(
+            app.state.registry.watch(settings.MODEL_REGISTRY_DIR, settings.MODEL_REGISTRY_POLL_SECONDS)
+        )
 
     app.add_event_handler(event_type="shutdown", func=functools.partial(event_shutdown))
 
 
+async def release_app_dependencies(app: FastAPI) -> None:
+
+    for task in (app.state.registry_watcher, app.state.warmup_task):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await app.state.registry.stop()
+
+
 async def main() -> None:
     uvloop.install()
 
     app = create_app()
 
-    await run_server(app, settings.APP_PORT)
\ No newline at end of file
+    await run_server(app, settings.APP_PORT)
+
+
+def bind_socket() -> socket.socket:
+    family = socket.AF_INET6 if settings.APP_HOST.version == 6 else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((str(settings.APP_HOST), settings.APP_PORT))
+    sock.listen(2048)
+    return sock
+
+
+def spawn_worker(sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    exit_code = 0
+    try:
+        # собственная группа процессов, чтобы родитель мог завершить вместе с воркером его пул инференса
+        os.setpgid(0, 0)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        uvloop.install()
+        asyncio.run(run_server(create_app(), settings.APP_PORT, sockets = [sock]), debug = settings.DEBUG)
+    except BaseException:
+        logger.exception("Worker %s failed", os.getpid())
+        exit_code = 1
+    finally:
+        # os._exit не вызывает обработчики atexit, поэтому очередь логов дописывается явно
+        stop_listener()
+        os._exit(exit_code)
+
+
+def run_workers() -> None:
+    """Запускает сервер в режиме pre-fork с settings.WORKERS процессами.
+
+    Модель загружается один раз в родительском процессе, после чего gc.freeze() переносит все объекты
+    в постоянное поколение сборщика мусора: он перестает их обходить и записывать в их заголовки,
+    поэтому страницы памяти с моделью остаются общими для воркеров благодаря copy-on-write.
+    Воркеры принимают соединения на общем слушающем сокете, а родитель перезапускает упавшие воркеры.
+    Новые версии модели из MODEL_REGISTRY_DIR каждый воркер подхватывает сам (см. core.registry).
+    """
+    preloaded_dependencies.update(load_model_dependencies())
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket()
+    logger.info("Starting %s workers on %s:%s", settings.WORKERS, settings.APP_HOST, settings.APP_PORT)
+
+    workers: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum: int, _: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(settings.WORKERS):
+        workers[spawn_worker(sock)] = time.monotonic()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = workers.pop(pid, None)
+        if started_at is None:
+            continue
+        try:
+            # процессы пула инференса упавшего воркера иначе остались бы сиротами
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        if stopping:
+            continue
+        logger.warning("Worker %s exited with code %s, restarting", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started_at < settings.WORKER_RESTART_DELAY:
+            # не перезапускаем воркер в бесконечном цикле, если он падает сразу после старта
+            time.sleep(settings.WORKER_RESTART_DELAY)
+        if not stopping:
+            workers[spawn_worker(sock)] = time.monotonic()
+
+    sock.close()
+    logger.info("All workers are stopped")
+
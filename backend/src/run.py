@@ -1,5 +1,8 @@
 import asyncio
 
-from main import main, settings
+from main import main, run_workers, settings
 
-asyncio.run(main(), debug=settings.DEBUG)
\ No newline at end of file
+if settings.WORKERS > 1:
+    run_workers()
+else:
+    asyncio.run(main(), debug=settings.DEBUG)
\ No newline at end of file
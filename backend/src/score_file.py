@@ -0,0 +1,205 @@
+"""
+Офлайн-скоринг файла с отзывами.
+
+Входной файл (CSV, JSONL или Parquet) читается чанками, чанки параллельно скорятся в пуле процессов,
+а предсказания записываются в JSONL в порядке строк входного файла: {"row": <номер строки>, "trends": [<названия меток>]}.
+После каждого записанного чанка сохраняется контрольная точка <output>.checkpoint, поэтому после падения
+запуск с --resume продолжает с первой незаписанной строки.
+
+Пример:
+    python backend/src/score_file.py reviews.parquet predictions.jsonl --column text --workers 8
+"""
+import argparse
+import collections
+import concurrent.futures
+import functools
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from core.artifact import MAPPING_FILE
+from core.data import load_mapping, load_model, predict_batch, preprocess
+from core.definitions import DATA_DIR
+from core.settings import Settings
+
+settings = Settings()
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+INPUT_FORMATS = (".csv", ".jsonl", ".ndjson", ".parquet")
+
+# модель процесса-воркера, задается один раз в initializer пула
+_worker_model: Any = None
+
+
+def _init_worker(model: Any, loader: Union[Callable[[], Any], None]) -> None:
+    global _worker_model
+    _worker_model = model if loader is None else loader()
+    return None
+
+
+def _score_chunk(data: List[str]) -> np.ndarray:
+    return predict_batch(data, _worker_model).astype(np.uint8, copy = False)
+
+
+def read_chunks(path: pathlib.Path, column: str, chunk_size: int, skip_rows: int = 0) -> Iterator[List[str]]:
+    """Читает колонку column входного файла чанками по chunk_size строк, пропуская первые skip_rows строк."""
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        import pandas as pd
+
+        frames = pd.read_csv(path, usecols = [column], dtype = {column: str}, chunksize = chunk_size,
+                             skiprows = range(1, skip_rows + 1), keep_default_na = False)
+        columns = (frame[column] for frame in frames)
+        skip_rows = 0
+    elif suffix in (".jsonl", ".ndjson"):
+        import pandas as pd
+
+        frames = pd.read_json(path, lines = True, dtype = False, chunksize = chunk_size)
+        columns = (frame[column] for frame in frames)
+    elif suffix == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise RuntimeError("Reading Parquet files requires pyarrow") from exc
+
+        batches = pq.ParquetFile(path).iter_batches(batch_size = chunk_size, columns = [column])
+        columns = (batch.column(0).to_pandas() for batch in batches)
+    else:
+        raise ValueError(f"Unsupported input format: {path.suffix}, expected .csv, .jsonl or .parquet")
+
+    for values in columns:
+        if skip_rows >= len(values):
+            skip_rows -= len(values)
+            continue
+        values = values.iloc[skip_rows:]
+        skip_rows = 0
+        yield [preprocess(value).strip() if value is not None and value == value else "" for value in values.tolist()]
+
+
+def load_checkpoint(output: pathlib.Path) -> Dict[str, Any]:
+    checkpoint_path = output.with_name(output.name + CHECKPOINT_SUFFIX)
+    if not checkpoint_path.is_file():
+        return {"rows": 0, "output_bytes": 0}
+    with open(checkpoint_path, "r") as f:
+        return json.load(f)
+
+
+def save_checkpoint(output: pathlib.Path, checkpoint: Dict[str, Any]) -> None:
+    checkpoint_path = output.with_name(output.name + CHECKPOINT_SUFFIX)
+    staging = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+    with open(staging, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(staging, checkpoint_path)
+    return None
+
+
+def render_chunk(prediction: np.ndarray, names: Dict[int, str], first_row: int) -> bytes:
+    rows, columns = np.nonzero(prediction == 1)
+    bounds = np.searchsorted(rows, np.arange(prediction.shape[0] + 1)).tolist()
+    labels = [names[idx] for idx in columns.tolist()]
+    lines = [
+        json.dumps({"row": first_row + offset, "trends": labels[start:end]}, ensure_ascii = False)
+        for offset, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def score_file(input_path: pathlib.Path, output: pathlib.Path, column: str, model_path: str,
+               chunk_size: int, workers: int, resume: bool) -> Tuple[int, float]:
+    """Скорит файл и возвращает число обработанных в этом запуске строк и затраченное время."""
+    if input_path.suffix.lower() not in INPUT_FORMATS:
+        raise ValueError(f"Unsupported input format: {input_path.suffix}, expected one of {', '.join(INPUT_FORMATS)}")
+    if not resume:
+        output.with_name(output.name + CHECKPOINT_SUFFIX).unlink(missing_ok = True)
+    checkpoint = load_checkpoint(output) if resume else {"rows": 0, "output_bytes": 0}
+    if resume and checkpoint.get("input") not in (None, str(input_path.absolute())):
+        raise ValueError(f"Checkpoint of {output} belongs to another input file: {checkpoint['input']}")
+    checkpoint["input"] = str(input_path.absolute())
+
+    # модель загружается один раз в родительском процессе и достается воркерам через fork
+    loader = functools.partial(
+        load_model, model_path, compile = settings.MODEL_COMPILE, compact_vocabulary = settings.MODEL_COMPACT_VOCABULARY
+    )
+    model = loader()
+    mapping_path = pathlib.Path(model_path) / MAPPING_FILE
+    if not mapping_path.is_file():
+        mapping_path = DATA_DIR / "mapping_backend.json"
+    names = {int(idx): trend[0] for idx, trend in load_mapping(mapping_path).items()}
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context, initargs = multiprocessing.get_context("fork"), (model, None)
+    else:
+        mp_context, initargs = multiprocessing.get_context("spawn"), (None, loader)
+
+    mode = "r+b" if resume and output.exists() else "wb"
+    started_at = time.monotonic()
+    last_report = started_at
+    scored = 0
+    with open(output, mode) as out, concurrent.futures.ProcessPoolExecutor(
+        max_workers = workers, mp_context = mp_context, initializer = _init_worker, initargs = initargs
+    ) as pool:
+        # дописанный после последней контрольной точки хвост отбрасывается
+        out.truncate(checkpoint["output_bytes"])
+        out.seek(checkpoint["output_bytes"])
+
+        # в работе не больше 2 * workers чанков: память ограничена, а результаты пишутся по порядку
+        in_flight: Deque[Tuple[int, concurrent.futures.Future]] = collections.deque()
+        chunks = read_chunks(input_path, column, chunk_size, skip_rows = checkpoint["rows"])
+        next_row = checkpoint["rows"]
+        exhausted = False
+        while not exhausted or in_flight:
+            while not exhausted and len(in_flight) < 2 * workers:
+                data = next(chunks, None)
+                if data is None:
+                    exhausted = True
+                    break
+                in_flight.append((next_row, pool.submit(_score_chunk, data)))
+                next_row += len(data)
+
+            if not in_flight:
+                break
+            first_row, future = in_flight.popleft()
+            prediction = future.result()
+            out.write(render_chunk(prediction, names, first_row))
+            out.flush()
+            os.fsync(out.fileno())
+            scored += prediction.shape[0]
+            checkpoint["rows"] = first_row + prediction.shape[0]
+            checkpoint["output_bytes"] = out.tell()
+            save_checkpoint(output, checkpoint)
+
+            now = time.monotonic()
+            if now - last_report >= 5:
+                print(f"{checkpoint['rows']} rows scored, {scored / (now - started_at):.0f} rows/sec", file = sys.stderr)
+                last_report = now
+
+    return scored, time.monotonic() - started_at
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Scores a CSV, JSONL or Parquet file of reviews into a JSONL file of predictions")
+    parser.add_argument("input", type = pathlib.Path, help = "input file: .csv, .jsonl or .parquet")
+    parser.add_argument("output", type = pathlib.Path, help = "output JSONL file")
+    parser.add_argument("--column", type = str, default = "text", help = "column with review texts")
+    parser.add_argument("--model", type = str, default = settings.MODEL_PATH, help = "pickled pipeline or model artifact directory")
+    parser.add_argument("--chunk-size", type = int, default = 10000, help = "rows per model call")
+    parser.add_argument("--workers", type = int, default = os.cpu_count() or 1, help = "number of scoring processes")
+    parser.add_argument("--resume", action = "store_true", help = "continue from the checkpoint of a previous run")
+    args = parser.parse_args()
+
+    if args.chunk_size < 1 or args.workers < 1:
+        parser.error("--chunk-size and --workers must be positive")
+
+    scored, elapsed = score_file(args.input, args.output, args.column, args.model, args.chunk_size, args.workers, args.resume)
+    print(f"{scored} rows scored in {elapsed:.1f} s, {scored / max(elapsed, 1e-9):.0f} rows/sec")
+    return None
+
+
+if __name__ == "__main__":
+    main()
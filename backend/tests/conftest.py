@@ -0,0 +1,8 @@
+import pathlib
+import sys
+
+BACKEND_DIR = pathlib.Path(__file__).parent.parent.absolute()
+
+# тесты импортируют модули сервиса так же, как run.py, и корпус бенчмарков (benchmarks/corpus.py)
+sys.path.insert(0, str(BACKEND_DIR / "src"))
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
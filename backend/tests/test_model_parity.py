@@ -0,0 +1,93 @@
+"""
+Паритет быстрого пути инференса с исходным Pipeline sklearn.
+
+Модель, загруженная через core.data.load_model из pickle-файла и из директории артефакта (core.artifact),
+со словарем CompactVocabulary и без него, должна давать те же предсказания, что Pipeline.predict.
+"""
+import pathlib
+import pickle
+from typing import Any, List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from corpus import MAPPING_PATH, MODEL_PATH, make_corpus
+from core.artifact import export_artifact
+from core.data import load_mapping, load_model, predict_batch
+from core.scorer import LinearScorer
+from core.tfidf import TfidfFeatures
+from core.vocabulary import CompactVocabulary
+
+# тексты, которых нет в корпусе бенчмарков: пустые, без кириллицы, со смешанными алфавитами и эмодзи
+EDGE_CASES = [
+    "",
+    " ",
+    "\n\t",
+    "The app keeps crashing on startup",
+    "ERROR 500!!!",
+    "1234567890",
+    "café naïve façade",
+    "应用程序崩溃了",
+    "😀😀😀 👍",
+    "оплата не проходит, error code 0x80070005",
+    "ЁЖИК в тумане ёжик",
+    "a",
+]
+
+
+def load_pipeline() -> Any:
+    with open(MODEL_PATH, "rb") as f:
+        return pickle.load(f)
+
+
+@pytest.fixture(scope = "module")
+def held_out_corpus() -> List[str]:
+    # seed не совпадает с корпусами бенчмарков
+    return make_corpus(2000, seed = 20240601) + EDGE_CASES
+
+
+@pytest.fixture(scope = "module")
+def expected(held_out_corpus: List[str]) -> np.ndarray:
+    return np.array(load_pipeline().predict(pd.DataFrame(columns = ["text"], data = held_out_corpus)))
+
+
+@pytest.fixture(scope = "module")
+def artifact_path(tmp_path_factory: pytest.TempPathFactory) -> pathlib.Path:
+    return export_artifact(load_pipeline(), tmp_path_factory.mktemp("artifacts"), "parity", mapping = load_mapping(MAPPING_PATH))
+
+
+def assert_parity(model: Any, corpus: List[str], expected: np.ndarray) -> None:
+    actual = predict_batch(corpus, model)
+    assert actual.shape == expected.shape
+    mismatches = [corpus[idx] for idx in np.flatnonzero(np.any(actual != expected, axis = 1))]
+    assert mismatches == []
+
+
+@pytest.mark.parametrize("compact_vocabulary", [True, False])
+def test_pickled_model_matches_pipeline(held_out_corpus: List[str], expected: np.ndarray, compact_vocabulary: bool) -> None:
+    model = load_model(MODEL_PATH, compact_vocabulary = compact_vocabulary)
+    assert isinstance(model, LinearScorer)
+    if compact_vocabulary:
+        # в продакшене словарь хранится в CompactVocabulary (core.tfidf), а не в векторизаторе sklearn
+        assert isinstance(model.features, TfidfFeatures)
+        assert isinstance(model.features.vocabulary, CompactVocabulary)
+    assert_parity(model, held_out_corpus, expected)
+
+
+@pytest.mark.parametrize("compact_vocabulary", [True, False])
+def test_artifact_matches_pipeline(artifact_path: pathlib.Path, held_out_corpus: List[str], expected: np.ndarray,
+                                   compact_vocabulary: bool) -> None:
+    model = load_model(artifact_path, compact_vocabulary = compact_vocabulary)
+    assert isinstance(model, LinearScorer)
+    assert isinstance(model.features, TfidfFeatures)
+    assert isinstance(model.features.vocabulary, CompactVocabulary if compact_vocabulary else dict)
+    assert_parity(model, held_out_corpus, expected)
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_single_text_matches_batch(artifact_path: pathlib.Path, text: str) -> None:
+    # одиночный запрос (micro-batching выключен) и пакет должны давать одну и ту же строку предсказания
+    model = load_model(artifact_path)
+    corpus = make_corpus(16, seed = 7) + [text]
+    assert np.array_equal(predict_batch([text], model)[0], predict_batch(corpus, model)[-1])
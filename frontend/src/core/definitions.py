@@ -16,4 +16,15 @@ MODEL_DIR = ROOT_DIR / "backend" / "src" / "models"
 
 BACKEND_HOST = get_env_variable("BACKEND_HOST", "http://dls_trends_indicator_backend")
 BACKEND_PORT = get_env_variable("BACKEND_PORT")
-FRONTEND_PORT = get_env_variable("FRONTEND_PORT")
\ No newline at end of file
+FRONTEND_PORT = get_env_variable("FRONTEND_PORT")
+
+# пул соединений и таймауты клиента backend (см. services.trends_indicator.ml)
+BACKEND_POOL_SIZE = int(get_env_variable("BACKEND_POOL_SIZE", 16))
+BACKEND_CONNECT_TIMEOUT = float(get_env_variable("BACKEND_CONNECT_TIMEOUT", 3.05))
+BACKEND_READ_TIMEOUT = float(get_env_variable("BACKEND_READ_TIMEOUT", 30))
+BACKEND_RETRIES = int(get_env_variable("BACKEND_RETRIES", 3))
+BACKEND_RETRY_BACKOFF = float(get_env_variable("BACKEND_RETRY_BACKOFF", 0.3))
+
+# разметка файлов: строк в одном запросе к backend и число одновременных запросов (см. services.trends_indicator.bulk)
+BULK_CHUNK_SIZE = int(get_env_variable("BULK_CHUNK_SIZE", 500))
+BULK_MAX_IN_FLIGHT = int(get_env_variable("BULK_MAX_IN_FLIGHT", 4))
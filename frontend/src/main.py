@@ -1,5 +1,13 @@
+import asyncio
+import os
+import pathlib
+import tempfile
+
+import requests
 import streamlit as st
 
+from core.definitions import BULK_CHUNK_SIZE, BULK_MAX_IN_FLIGHT
+from services.trends_indicator.bulk import FILE_TYPES, iter_chunks, read_columns, score_file
 from services.trends_indicator.ml import predict_trends
 
 st.set_page_config(
@@ -19,6 +27,16 @@ def main()-> None:
                 Множественная классификация отличается от многоклассовой тем, что экземпляр данных может одновременно относиться сразу к нескольким классам.\
                 На вход модели мы подаём только комментарий Пользователя и пытаемся определить для него 50 различных меток классов, к которым он может относиться.", unsafe_allow_html = True)
 
+    single_review_tab, file_tab = st.tabs(["Отзыв", "Файл"])
+    with single_review_tab:
+        single_review()
+    with file_tab:
+        bulk_file()
+
+    return None
+
+def single_review()-> None:
+
     review = st.text_area(label = "Введите текст отзыва:", key = "text_input_area", value = "")
 
     col_1, col_2 = st.columns(2)
@@ -28,13 +46,73 @@ def main()-> None:
         if len(review) == 0:
             st.write(":red[Длина сообщения не может быть нулевой!]")
         else:
-            response = predict_trends(data = review)
+            try:
+                response = predict_trends(data = review)
+                response.raise_for_status()
+            except requests.RequestException:
+                # таймауты и повторы задаются в services.trends_indicator.ml
+                st.write(":red[Сервис временно недоступен, попробуйте позже]")
+                return None
             response_dict = response.json()
             if len(response_dict["trends_list"]) > 0:
                 st.write("<br><br>".join([f"<b>Name:</b> {trend[0]}<br><b>Description:</b><br>{trend[1]}" for trend in response_dict["trends_list"]]), unsafe_allow_html = True)
             else:
                 st.write(":red[Не удалось определить тренды:(]")
-    
+
+    return None
+
+def bulk_file()-> None:
+
+    uploaded = st.file_uploader("Загрузите CSV или XLSX с отзывами:", type = list(FILE_TYPES))
+    if uploaded is None:
+        return None
+    file_type = pathlib.Path(uploaded.name).suffix.lower().lstrip(".")
+    try:
+        columns = read_columns(uploaded, file_type)
+    except Exception as exc:
+        st.write(f":red[Не удалось прочитать файл: {exc}]")
+        return None
+    if len(columns) == 0:
+        st.write(":red[В файле нет колонок]")
+        return None
+    column = st.selectbox("Колонка с текстом отзыва:", columns, index = columns.index("text") if "text" in columns else 0)
+
+    if st.button("Разметить файл", type = "primary", use_container_width = True):
+        progress = st.progress(0.0, text = "Разметка...")
+
+        def on_progress(rows: int, fraction: float, rows_per_second: float) -> None:
+            progress.progress(fraction, text = f"Размечено строк: {rows}, {rows_per_second:.0f} строк/с")
+
+        # результат пишется на диск, а не в память сессии; предыдущий результат сессии удаляется
+        previous = st.session_state.pop("bulk_result_path", None)
+        if previous is not None and os.path.exists(previous):
+            os.remove(previous)
+        fd, result_path = tempfile.mkstemp(prefix = "trends_", suffix = ".csv")
+        try:
+            with os.fdopen(fd, "w", newline = "", encoding = "utf-8") as output:
+                chunks = iter_chunks(uploaded, file_type, column, BULK_CHUNK_SIZE)
+                rows = asyncio.run(score_file(chunks, output, BULK_MAX_IN_FLIGHT, on_progress))
+        except requests.RequestException:
+            os.remove(result_path)
+            st.write(":red[Сервис временно недоступен, попробуйте позже]")
+            return None
+        except Exception as exc:
+            os.remove(result_path)
+            st.write(f":red[Не удалось разметить файл: {exc}]")
+            return None
+        progress.progress(1.0, text = f"Размечено строк: {rows}")
+        st.session_state["bulk_result_path"] = result_path
+        st.session_state["bulk_result_name"] = f"{pathlib.Path(uploaded.name).stem}_trends.csv"
+
+    result_path = st.session_state.get("bulk_result_path")
+    if result_path is not None and os.path.exists(result_path):
+        import pandas as pd
+
+        # в браузер отправляется только начало результата, весь файл доступен для скачивания
+        st.dataframe(pd.read_csv(result_path, nrows = 100, keep_default_na = False), use_container_width = True)
+        with open(result_path, "rb") as f:
+            st.download_button("Скачать результат", f, file_name = st.session_state["bulk_result_name"], mime = "text/csv", use_container_width = True)
+
     return None
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""
+Разметка файла с отзывами через backend.
+
+Файл CSV или XLSX читается по частям, каждая часть отправляется в /api/v1/predict_trends/batch,
+одновременно в работе не больше max_in_flight частей. Результаты записываются в CSV-файл на диске
+в порядке строк исходного файла, поэтому ни frontend, ни backend не держат в памяти весь файл.
+"""
+import asyncio
+import collections
+import csv
+import io
+import time
+from typing import IO, Any, Callable, Deque, Iterator, List, Tuple
+
+from services.trends_indicator.ml import predict_trends_batch_async
+from services.trends_indicator.schemas.predict_trends import PredictTrendsBatchResponse
+
+FILE_TYPES = ("csv", "xlsx")
+RESULT_COLUMNS = ["row", "text", "trends", "error"]
+
+# (номер первой строки, тексты, доля прочитанного файла)
+Chunk = Tuple[int, List[str], float]
+ProgressCallback = Callable[[int, float, float], None]
+
+
+def _open_workbook(file: IO[bytes]) -> Any:
+    try:
+        import openpyxl
+    except ImportError as exc:
+        raise RuntimeError("Reading XLSX files requires openpyxl") from exc
+    # read_only: строки листа читаются потоково, а не загружаются целиком
+    return openpyxl.load_workbook(file, read_only = True, data_only = True)
+
+
+def read_columns(file: IO[bytes], file_type: str) -> List[str]:
+    """Названия колонок из первой строки файла."""
+    file.seek(0)
+    if file_type == "csv":
+        import pandas as pd
+
+        return [str(column) for column in pd.read_csv(file, nrows = 0).columns]
+    workbook = _open_workbook(file)
+    header = next(workbook.active.iter_rows(max_row = 1, values_only = True), ())
+    workbook.close()
+    return [str(column) for column in header if column is not None]
+
+
+def _as_text(value: Any) -> str:
+    # пустые ячейки отправляются пустой строкой, backend вернет для них ошибку валидации
+    return "" if value is None or value != value else str(value)
+
+
+def iter_chunks(file: IO[bytes], file_type: str, column: str, chunk_size: int) -> Iterator[Chunk]:
+    file.seek(0, io.SEEK_END)
+    size = max(file.tell(), 1)
+    file.seek(0)
+    first_row = 0
+    if file_type == "csv":
+        import pandas as pd
+
+        for frame in pd.read_csv(file, usecols = [column], dtype = {column: str}, chunksize = chunk_size, keep_default_na = False):
+            texts = [_as_text(value) for value in frame[column].tolist()]
+            yield first_row, texts, min(file.tell() / size, 1.0)
+            first_row += len(texts)
+        return None
+
+    workbook = _open_workbook(file)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only = True)
+        header = [str(value) for value in next(rows, ())]
+        idx = header.index(column)
+        total = max((sheet.max_row or 1) - 1, 1)
+        texts: List[str] = []
+        for row in rows:
+            texts.append(_as_text(row[idx] if idx < len(row) else None))
+            if len(texts) == chunk_size:
+                yield first_row, texts, min((first_row + len(texts)) / total, 1.0)
+                first_row += len(texts)
+                texts = []
+        if texts:
+            yield first_row, texts, 1.0
+    finally:
+        workbook.close()
+    return None
+
+
+def render_rows(first_row: int, texts: List[str], response: PredictTrendsBatchResponse) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for offset, (text, item) in enumerate(zip(texts, response.results)):
+        trends = "; ".join(trend[0] for trend in item.trends_list) if item.trends_list is not None else ""
+        error = "; ".join(str(error.get("msg", "")) for error in item.detail) if item.detail is not None else ""
+        writer.writerow([first_row + offset, text, trends, error])
+    return buffer.getvalue()
+
+
+async def _score_chunk(texts: List[str]) -> PredictTrendsBatchResponse:
+    response = await predict_trends_batch_async(texts)
+    response.raise_for_status()
+    return PredictTrendsBatchResponse.model_validate(response.json())
+
+
+async def score_file(chunks: Iterator[Chunk], output: IO[str], max_in_flight: int, on_progress: ProgressCallback) -> int:
+    """Размечает части файла с не более чем max_in_flight одновременными запросами к backend.
+
+    Результаты записываются в output в порядке строк, on_progress получает число размеченных строк,
+    долю прочитанного файла и скорость в строках в секунду. Возвращает число размеченных строк.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be positive")
+    writer = csv.writer(output)
+    writer.writerow(RESULT_COLUMNS)
+    in_flight: Deque[Tuple[int, List[str], float, asyncio.Task]] = collections.deque()
+    started_at = time.monotonic()
+    scored = 0
+    exhausted = False
+    try:
+        while not exhausted or in_flight:
+            while not exhausted and len(in_flight) < max_in_flight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                first_row, texts, fraction = chunk
+                in_flight.append((first_row, texts, fraction, asyncio.create_task(_score_chunk(texts))))
+            if not in_flight:
+                break
+            first_row, texts, fraction, task = in_flight.popleft()
+            output.write(render_rows(first_row, texts, await task))
+            scored += len(texts)
+            on_progress(scored, fraction, scored / max(time.monotonic() - started_at, 1e-9))
+    finally:
+        for _, _, _, task in in_flight:
+            task.cancel()
+    return scored
@@ -1,25 +1,144 @@
-from typing import Union
+import asyncio
+import threading
+from typing import Any, Dict, List, Sequence, Union
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from core.logger import JSONLogger
 from core.definitions import (
     BACKEND_HOST,
-    BACKEND_PORT
+    BACKEND_PORT,
+    BACKEND_POOL_SIZE,
+    BACKEND_CONNECT_TIMEOUT,
+    BACKEND_READ_TIMEOUT,
+    BACKEND_RETRIES,
+    BACKEND_RETRY_BACKOFF
 )
-from services.trends_indicator.schemas.predict_trends import PredictTrendsRequest
+from services.trends_indicator.schemas.predict_trends import PredictTrendsRequest, PredictTrendsBatchRequest
 
 
 logger = JSONLogger(__name__)
 
+# методы без побочных эффектов, которые безопасно повторять
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class BackendClient:
+    """Клиент backend с общим пулом keep-alive соединений.
+
+    Один requests.Session на процесс: сессии Streamlit выполняются в потоках одного процесса
+    и переиспользуют соединения пула вместо открытия нового TCP-соединения на каждый клик.
+    Запросы ограничены таймаутами на подключение и чтение; идемпотентные запросы повторяются
+    не больше retries раз с экспоненциальной задержкой (и с учетом Retry-After от backend).
+    Асинхронные методы выполняют те же вызовы в пуле потоков asyncio, а число одновременных
+    запросов не превышает pool_size, поэтому соединений в пуле всегда хватает.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 16, connect_timeout: float = 3.05, read_timeout: float = 30.0,
+                 retries: int = 3, backoff_factor: float = 0.3):
+        if pool_size < 1:
+            raise ValueError("pool_size must be positive")
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total = retries,
+            backoff_factor = backoff_factor,
+            status_forcelist = RETRY_STATUSES,
+            allowed_methods = IDEMPOTENT_METHODS,
+            respect_retry_after_header = True,
+            raise_on_status = False
+        )
+        # pool_block: при исчерпании пула запрос ждет свободное соединение, а не открывает лишнее
+        self._adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = pool_size, max_retries = retry, pool_block = True)
+        self._session = requests.Session()
+        self._session.mount("http://", self._adapter)
+        self._session.mount("https://", self._adapter)
+        self._requests = 0
+        self._requests_lock = threading.Lock()
+
+    def get(self, path: str, json: Any = None) -> requests.Response:
+        with self._requests_lock:
+            self._requests += 1
+        return self._session.get(f"{self.base_url}{path}", json = json, timeout = self.timeout)
+
+    async def aget(self, path: str, json: Any = None) -> requests.Response:
+        return await asyncio.to_thread(self.get, path, json)
+
+    async def aget_many(self, path: str, payloads: Sequence[Any], max_in_flight: Union[int, None] = None) -> List[requests.Response]:
+        """Отправляет запросы со всеми payloads параллельно, сохраняя их порядок в ответе."""
+        semaphore = asyncio.Semaphore(min(max_in_flight or self.pool_size, self.pool_size))
+
+        async def send(payload: Any) -> requests.Response:
+            async with semaphore:
+                return await self.aget(path, payload)
+
+        return await asyncio.gather(*[send(payload) for payload in payloads])
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика пула: число запросов и открытых соединений; остальные запросы переиспользовали соединение."""
+        pools = self._adapter.poolmanager.pools
+        connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+        return {
+            "pool_size": self.pool_size,
+            "requests": self._requests,
+            "connections_opened": connections,
+            "connections_reused": max(self._requests - connections, 0),
+        }
+
+    def close(self) -> None:
+        self._session.close()
+        return None
+
+
+_client: Union[BackendClient, None] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> BackendClient:
+    """Возвращает общий для процесса клиент backend, создавая его при первом обращении."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = BackendClient(
+                    f"{BACKEND_HOST}:{BACKEND_PORT}",
+                    pool_size = BACKEND_POOL_SIZE,
+                    connect_timeout = BACKEND_CONNECT_TIMEOUT,
+                    read_timeout = BACKEND_READ_TIMEOUT,
+                    retries = BACKEND_RETRIES,
+                    backoff_factor = BACKEND_RETRY_BACKOFF
+                )
+    return _client
+
+
 def predict_trends(data: str) -> requests.models.Response:
-    global logger
-    request_model: PredictTrendsRequest
+    request_model = PredictTrendsRequest(
+        data = data
+    )
+    return get_client().get("/api/v1/predict_trends", json = request_model.model_dump())
+
 
+async def predict_trends_async(data: str) -> requests.models.Response:
     request_model = PredictTrendsRequest(
         data = data
     )
+    return await get_client().aget("/api/v1/predict_trends", json = request_model.model_dump())
+
+
+def predict_trends_batch(data: List[str]) -> requests.models.Response:
+    request_model = PredictTrendsBatchRequest(
+        data = data
+    )
+    return get_client().get("/api/v1/predict_trends/batch", json = request_model.model_dump())
 
-    url = f"{BACKEND_HOST}:{BACKEND_PORT}/api/v1/predict_trends"
-    response = requests.get(url, json=request_model.model_dump())
 
-    return response
+async def predict_trends_batch_async(data: List[str]) -> requests.models.Response:
+    return await asyncio.to_thread(predict_trends_batch, data)
@@ -1,4 +1,6 @@
-from typing import List
+from typing import Any, Dict, List, Union
+
+from pydantic import Field
 
 from services.trends_indicator.schemas.base_schema import BaseSchema
 
@@ -7,4 +9,15 @@ class PredictTrendsRequest(BaseSchema):
     data: str
 
 class PredictTrendsResponse(BaseSchema):
-    trends_list: List[List[str]]
\ No newline at end of file
+    trends_list: List[List[str]]
+
+class PredictTrendsBatchRequest(BaseSchema):
+    # элементы валидирует backend по одному, ошибка в одном отзыве не отклоняет весь пакет
+    data: List[Any] = Field(min_length = 1)
+
+class PredictTrendsBatchItem(BaseSchema):
+    trends_list: Union[List[List[str]], None] = None
+    detail: Union[List[Dict[str, Any]], None] = None
+
+class PredictTrendsBatchResponse(BaseSchema):
+    results: List[PredictTrendsBatchItem]
@@ -1,29 +1,50 @@
-import pickle
-import json
+import pathlib
+from typing import Any, Dict, List
+
 import streamlit as st
 
-from backend.src.core.data import preprocess, predict, explain_prediction
-from backend.src.core.definitions import DATA_DIR, MODEL_DIR
+from backend.src.core.artifact import MAPPING_FILE
+from backend.src.core.data import load_model, load_mapping, preprocess, predict, explain_prediction
+from backend.src.core.definitions import DATA_DIR
+from backend.src.core.settings import Settings
+
+settings = Settings()
 
 st.set_page_config(
     page_title="DLS | Trends Indicator",
     page_icon="💬"
 )
 
-def schema_state_init()-> None:
-    if "model" not in st.session_state:
-        with open(MODEL_DIR / 'model.pkl', 'rb') as f:
-            st.session_state["model"] = pickle.load(f)
-    if "mapping" not in st.session_state:
-        with open(DATA_DIR / 'mapping_backend.json', 'r') as f:
-            st.session_state["mapping"] = json.load(f)
+@st.cache_resource(show_spinner = "Загрузка модели...")
+def get_model_registry() -> Dict[str, Any]:
+    """Модель и описание меток, общие для всех сессий процесса.
+
+    st.cache_resource загружает их один раз при первом обращении (под блокировкой, даже если сессии
+    стартуют одновременно), поэтому память не растет с числом пользователей, а новые сессии не ждут загрузки.
+    """
+    # MODEL_PATH может указывать на директорию артефакта (см. core.artifact), тогда pickle и sklearn не нужны
+    mapping_path = pathlib.Path(settings.MODEL_PATH) / MAPPING_FILE
+    if not mapping_path.is_file():
+        mapping_path = DATA_DIR / 'mapping_backend.json'
+    return {
+        "model": load_model(settings.MODEL_PATH),
+        "mapping": load_mapping(mapping_path),
+    }
+
+@st.cache_data(max_entries = settings.PREDICTION_CACHE_MAX_ENTRIES, ttl = settings.PREDICTION_CACHE_TTL_SECONDS, show_spinner = False)
+def predict_trends(review: str) -> List[List[str]]:
+    """Предсказание с мемоизацией по тексту отзыва, общей для всех сессий."""
+    registry = get_model_registry()
+    data = preprocess(review)
+    prediction = predict(data, registry["model"])
+    return explain_prediction(registry["mapping"], prediction)
 
 def clear_text() -> None:
     st.session_state["text_input_area"] = ""
 
 def main()-> None:
     
-    schema_state_init()
+    get_model_registry()
 
     st.header(f"Классификация Пользовательского контента", divider='rainbow')     
     
@@ -41,9 +62,8 @@ def main()-> None:
         if len(review) == 0:
             st.write(":red[Длина сообщения не может быть нулевой!]")
         else:
-            data = preprocess(review)
-            prediction = predict(data, st.session_state["model"])
-            trends_list = explain_prediction(st.session_state["mapping"], prediction)
+            # пробелы по краям не влияют на предсказание (как str_strip_whitespace в схемах backend)
+            trends_list = predict_trends(review.strip())
             if len(trends_list) > 0:
                 st.write("<br><br>".join([f"<b>Name:</b> {trend[0]}<br><b>Description:</b><br>{trend[1]}" for trend in trends_list]), unsafe_allow_html = True)
             else: